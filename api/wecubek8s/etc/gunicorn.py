@@ -4,14 +4,21 @@ from __future__ import absolute_import
 
 import os
 import logging
-from logging.handlers import WatchedFileHandler
 import multiprocessing
 
 from talos.core import config as __config
+from talos.core import utils as __utils
+from wecubek8s.common.loghandler import AsyncFileHandler
 
 __config.setup(os.environ.get('WECUBEK8S_CONF', '/etc/wecubek8s/wecubek8s.conf'),
                dir_path=os.environ.get('WECUBEK8S_CONF_DIR', '/etc/wecubek8s/wecubek8s.conf.d'))
 CONF = __config.CONF
+# 在master中加载application后再fork worker，模块与只读数据以copy-on-write方式共享
+preload_app = __utils.get_config(CONF, 'server.preload_app', False)
+if preload_app:
+    # application is loaded in master, gevent must patch before it imports ssl/threading
+    from gevent import monkey
+    monkey.patch_all()
 
 name = CONF.locale_app
 proc_name = CONF.locale_app
@@ -32,10 +39,10 @@ accesslog = "/dev/null"
 # 错误日志文件的路径
 errorlog = "/dev/null"
 acclog = logging.getLogger('gunicorn.access')
-acclog.addHandler(WatchedFileHandler(CONF.log.gunicorn_access))
+acclog.addHandler(AsyncFileHandler(CONF.log.gunicorn_access))
 acclog.propagate = False
 errlog = logging.getLogger('gunicorn.error')
-errlog.addHandler(WatchedFileHandler(CONF.log.gunicorn_error))
+errlog.addHandler(AsyncFileHandler(CONF.log.gunicorn_error))
 errlog.propagate = False
 
 # keyfile =
@@ -55,3 +62,15 @@ access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(L)s %(b)s "%(f)s" "
 # syslog_addr = udp://localhost:514
 # HTTP URL长度限制
 # limit_request_line = 4094
+
+
+def child_exit(server, worker):
+    # metrics of dead worker should be merged in multiprocess mode
+    from wecubek8s.common import metrics
+    metrics.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    if preload_app:
+        from wecubek8s.server import wsgi_server
+        wsgi_server.warmup()
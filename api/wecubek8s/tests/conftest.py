@@ -0,0 +1,14 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+
+from talos.server import base
+
+# register config interceptors(ENV@/RSA@)
+from wecubek8s.server import base as wecubek8s_base  # noqa
+
+# default config of project, values from ENV@ are empty
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etc', 'wecubek8s.conf')
+base.initialize_config(CONFIG_PATH)
@@ -0,0 +1,120 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import base64
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from talos.core import exceptions as base_ex
+from talos.middlewares import lazy_init
+
+from wecubek8s.middlewares import auth
+
+SECRET = base64.b64encode(b'test-signing-key').decode()
+
+
+def make_token(sub='admin', exp=None, authority='[SUB_SYSTEM,ADMIN]'):
+    token_info = {'sub': sub, 'exp': exp or int(time.time()) + 600, 'authority': authority, 'clientType': 'USER'}
+    return jwt.encode(token_info, b'test-signing-key', algorithm='HS512').decode()
+
+
+class FakeRequest:
+    def __init__(self, token=None, path='/kubernetes/v1/clusters'):
+        self.path = path
+        self.headers = {'AUTHORIZATION': 'Bearer ' + token} if token else {}
+
+    def get_cookie_values(self, name):
+        return None
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    monkeypatch.setattr(auth, 'CONF', SimpleNamespace(jwt_signing_key=SECRET))
+    calls = []
+    decode = jwt.decode
+
+    def counted_decode(*args, **kwargs):
+        calls.append(args)
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, 'decode', counted_decode)
+    return calls
+
+
+def test_token_cache_lru():
+    cache = auth.TokenCache(2)
+    exp = time.time() + 60
+    cache.set('t1', {'sub': 'u1', 'exp': exp})
+    cache.set('t2', {'sub': 'u2', 'exp': exp})
+    assert cache.get('t1')['sub'] == 'u1'
+    cache.set('t3', {'sub': 'u3', 'exp': exp})
+    # t2 is least recently used
+    assert cache.get('t2') is None
+    assert cache.get('t1')['sub'] == 'u1'
+    assert cache.get('t3')['sub'] == 'u3'
+
+
+def test_token_cache_expired():
+    cache = auth.TokenCache(2)
+    cache.set('t1', {'sub': 'u1', 'exp': time.time() - 1})
+    assert cache.get('t1') is None
+
+
+def test_token_cache_disabled():
+    cache = auth.TokenCache(0)
+    cache.set('t1', {'sub': 'u1', 'exp': time.time() + 60})
+    assert cache.get('t1') is None
+
+
+def test_verified_token_cached(decodes):
+    middleware = auth.JWTAuth()
+    token = make_token()
+    for _ in range(3):
+        req = FakeRequest(token)
+        middleware.process_request(req, None)
+        assert req.auth_user == 'admin'
+        assert req.auth_permissions == {'SUB_SYSTEM', 'ADMIN'}
+    assert len(decodes) == 1
+
+
+def test_cache_size_from_config(decodes, monkeypatch):
+    # middleware is created before config is loaded
+    middleware = lazy_init.LazyInit(auth.JWTAuth)
+    monkeypatch.setattr(auth, 'CONF', SimpleNamespace(jwt_signing_key=SECRET, auth=SimpleNamespace(token_cache_size=0)))
+    token = make_token()
+    for _ in range(2):
+        middleware.process_request(FakeRequest(token), None)
+    assert len(decodes) == 2
+
+
+def test_invalid_token_never_cached(decodes):
+    middleware = auth.JWTAuth()
+    token = make_token()[:-2] + 'xx'
+    for _ in range(2):
+        with pytest.raises(base_ex.AuthError):
+            middleware.process_request(FakeRequest(token), None)
+    assert len(decodes) == 2
+
+
+def test_expired_token(decodes):
+    with pytest.raises(base_ex.AuthError):
+        auth.JWTAuth().process_request(FakeRequest(make_token(exp=int(time.time()) - 10)), None)
+
+
+def test_missing_token(decodes):
+    with pytest.raises(base_ex.AuthError):
+        auth.JWTAuth().process_request(FakeRequest(), None)
+
+
+def test_delayed_token(decodes):
+    req = FakeRequest(make_token())
+    auth.JWTAuth().process_request(req, None)
+    delayed = req.auth_token_delayed()
+    # signed once only
+    assert req.auth_token_delayed() is delayed
+    token_info = jwt.decode(delayed, key=b'test-signing-key', algorithms=['HS512'])
+    assert token_info['sub'] == 'admin'
+    assert token_info['exp'] == req.auth_token_delayed.token_info['exp'] + 120
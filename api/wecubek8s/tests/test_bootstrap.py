@@ -0,0 +1,69 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(ROOT_PATH, 'etc', 'wecubek8s.conf')
+
+
+@pytest.fixture
+def run_script(tmp_path):
+    with open(CONFIG_PATH) as f:
+        content = f.read().replace('/var/log/wecubek8s', str(tmp_path))
+    config_path = str(tmp_path / 'wecubek8s.conf')
+    with open(config_path, 'w') as f:
+        f.write(content)
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': os.pathsep.join([ROOT_PATH] + [p for p in sys.path if p]),
+        'WECUBEK8S_CONF': config_path,
+        'WECUBEK8S_CONF_DIR': str(tmp_path / 'wecubek8s.conf.d'),
+        'KUBERNETES_DB_HOSTIP': '127.0.0.1',
+        'KUBERNETES_DB_HOSTPORT': '3306',
+        'KUBERNETES_DB_USERNAME': 'user',
+        'KUBERNETES_DB_PASSWORD': 'password',
+        'KUBERNETES_DB_SCHEMA': 'wecubek8s',
+    })
+
+    def _run(code):
+        # modules are checked in a fresh interpreter
+        proc = subprocess.run([sys.executable, '-c', textwrap.dedent(code)],
+                              cwd=ROOT_PATH,
+                              env=env,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE,
+                              timeout=60)
+        assert proc.returncode == 0, proc.stderr.decode('utf-8', 'replace')
+        return json.loads(proc.stdout.decode('utf-8').splitlines()[-1])
+
+    return _run
+
+
+def test_scheduler_without_wsgi_app(run_script):
+    result = run_script('''
+    import json
+    import sys
+    from talos.db import pool
+    from wecubek8s.server import scheduler
+    modules = ['wecubek8s.server.wsgi_server', 'wecubek8s.apps', 'kubernetes']
+    print(json.dumps({'imported': [m for m in modules if m in sys.modules], 'db': pool.defaultPool._pool is not None}))
+    ''')
+    assert result == {'imported': [], 'db': True}
+
+
+def test_watcher_without_wsgi_app(run_script):
+    result = run_script('''
+    import json
+    import sys
+    from wecubek8s.server import watcher
+    print(json.dumps({'imported': 'wecubek8s.server.wsgi_server' in sys.modules}))
+    ''')
+    assert result == {'imported': False}
@@ -0,0 +1,133 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from wecubek8s.common import controller
+from wecubek8s.common import wecube
+
+
+class SleepPlugin(controller.Plugin):
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+
+    def group_item(self, item):
+        return item['cluster']
+
+    def process(self, reqid, operator, item_index, item, **kwargs):
+        cluster = item['cluster']
+        with self.lock:
+            self.running[cluster] = self.running.get(cluster, 0) + 1
+            self.max_running[cluster] = max(self.max_running.get(cluster, 0), self.running[cluster])
+        # later items finish first
+        time.sleep(item['delay'])
+        with self.lock:
+            self.running[cluster] -= 1
+        if item.get('error'):
+            raise ValueError(item['error'])
+        return {'index': item_index}
+
+
+def make_items(clusters, count):
+    return [{
+        'callbackParameter': str(idx),
+        'cluster': clusters[idx % len(clusters)],
+        'delay': (count - idx) * 0.01
+    } for idx in range(count)]
+
+
+def test_process_items_keep_input_order():
+    items = make_items(['c1', 'c2'], 12)
+    results = SleepPlugin().process_items('req', 'admin', items)
+    assert [r['callbackParameter'] for r in results] == [str(idx) for idx in range(12)]
+    assert [r['index'] for r in results] == list(range(12))
+
+
+def test_process_items_concurrency_per_cluster():
+    plugin = SleepPlugin()
+    plugin.process_items('req', 'admin', make_items(['c1', 'c2'], 20))
+    # default plugin.concurrency_per_cluster
+    assert plugin.max_running['c1'] <= 4
+    assert plugin.max_running['c2'] <= 4
+
+
+def test_process_items_error_isolated():
+    items = make_items(['c1'], 3)
+    items[1]['error'] = 'boom'
+    results = SleepPlugin().process_items('req', 'admin', items)
+    assert [r['errorCode'] for r in results] == ['0', '1', '0']
+    assert results[1]['errorMessage'] == 'boom'
+
+
+class FakePluginJob:
+    statuses = []
+
+    def __init__(self, running=True, finished=True, save_error=None):
+        self.running = running
+        self.finished = finished
+        self.save_error = save_error
+
+    def __call__(self):
+        return self
+
+    def transit(self, rid, from_status, resource):
+        FakePluginJob.statuses.append(resource['status'])
+        if resource['status'] == 'running':
+            return self.running
+        if self.save_error:
+            raise self.save_error
+        return self.finished
+
+
+@pytest.fixture
+def job_env(mocker):
+    FakePluginJob.statuses = []
+    mocker.patch.object(controller, 'CONF', SimpleNamespace(wecube=SimpleNamespace(base_url='http://wecube')))
+    client_class = mocker.patch.object(controller.wecube, 'WeCubeClient')
+    return client_class.return_value
+
+
+def run_job(mocker, plugin, job, data):
+    mocker.patch.object(controller.db_resource, 'PluginJob', job)
+    plugin.run_job('job-1', {'request': None}, data)
+
+
+def test_run_job_success(mocker, job_env):
+    data = {'requestId': 'r1', 'inputs': make_items(['c1'], 2)}
+    run_job(mocker, SleepPlugin(), FakePluginJob(), data)
+    assert FakePluginJob.statuses == ['running', 'success']
+    result = job_env.plugin_callback.call_args[0][0]
+    assert result['resultCode'] == '0'
+    assert result['results']['requestId'] == 'r1'
+    assert len(result['results']['outputs']) == 2
+
+
+def test_run_job_failed_as_whole(mocker, job_env):
+    plugin = SleepPlugin()
+    mocker.patch.object(plugin, 'process_post', side_effect=ValueError('boom'))
+    data = {'requestId': 'r1', 'inputs': make_items(['c1'], 2)}
+    run_job(mocker, plugin, FakePluginJob(), data)
+    assert FakePluginJob.statuses == ['running', 'failed']
+    result = job_env.plugin_callback.call_args[0][0]
+    assert result == wecube.plugin_failed_result('r1', data['inputs'], 'boom')
+    assert [item['errorCode'] for item in result['results']['outputs']] == ['1', '1']
+
+
+def test_run_job_timeout_by_scheduler(mocker, job_env):
+    run_job(mocker, SleepPlugin(), FakePluginJob(running=False), {'requestId': 'r1', 'inputs': []})
+    assert FakePluginJob.statuses == ['running']
+    job_env.plugin_callback.assert_not_called()
+
+
+def test_run_job_callback_even_if_not_saved(mocker, job_env):
+    job = FakePluginJob(save_error=RuntimeError('db is down'))
+    run_job(mocker, SleepPlugin(), job, {'requestId': 'r1', 'inputs': make_items(['c1'], 1)})
+    job_env.plugin_callback.assert_called_once()
@@ -0,0 +1,51 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import time
+
+from wecubek8s.common import k8s
+
+
+def test_ensured_cache_hit():
+    cache = k8s.EnsuredCache()
+    assert not cache.hit('s1', 'namespace', 'ns', 'ns')
+    cache.add('s1', 'namespace', 'ns', 'ns', ttl=60)
+    assert cache.hit('s1', 'namespace', 'ns', 'ns')
+    assert not cache.hit('s2', 'namespace', 'ns', 'ns')
+
+
+def test_ensured_cache_content_changed():
+    cache = k8s.EnsuredCache()
+    cache.add('s1', 'secret', 'ns', 'registry', 'hash1', ttl=60)
+    assert cache.hit('s1', 'secret', 'ns', 'registry', 'hash1')
+    assert not cache.hit('s1', 'secret', 'ns', 'registry', 'hash2')
+
+
+def test_ensured_cache_expired(monkeypatch):
+    cache = k8s.EnsuredCache()
+    cache.add('s1', 'namespace', 'ns', 'ns', ttl=60)
+    now = time.time()
+    monkeypatch.setattr(k8s.time, 'time', lambda: now + 61)
+    assert not cache.hit('s1', 'namespace', 'ns', 'ns')
+
+
+def test_ensured_cache_disabled():
+    cache = k8s.EnsuredCache()
+    cache.add('s1', 'namespace', 'ns', 'ns', ttl=0)
+    assert not cache.hit('s1', 'namespace', 'ns', 'ns')
+
+
+def test_ensured_cache_invalidate():
+    cache = k8s.EnsuredCache()
+    cache.add('s1', 'namespace', 'ns1', 'ns1', ttl=60)
+    cache.add('s1', 'secret', 'ns1', 'registry', 'hash', ttl=60)
+    cache.add('s1', 'namespace', 'ns2', 'ns2', ttl=60)
+    cache.add('s2', 'namespace', 'ns1', 'ns1', ttl=60)
+    cache.invalidate('s1', 'ns1')
+    assert not cache.hit('s1', 'namespace', 'ns1', 'ns1')
+    assert not cache.hit('s1', 'secret', 'ns1', 'registry', 'hash')
+    assert cache.hit('s1', 'namespace', 'ns2', 'ns2')
+    assert cache.hit('s2', 'namespace', 'ns1', 'ns1')
+    cache.invalidate('s1')
+    assert not cache.hit('s1', 'namespace', 'ns2', 'ns2')
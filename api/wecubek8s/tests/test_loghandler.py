@@ -0,0 +1,99 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import logging
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from wecubek8s.common import loghandler
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_logger(handler, name):
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_write_rendered_message(tmp_path):
+    path = str(tmp_path / 'test.log')
+    handler = loghandler.AsyncFileHandler(path, flush_interval=0.05)
+    logger = make_logger(handler, 'test_loghandler.render')
+    args = {'key': 'before'}
+    logger.info('value: %s', args)
+    # message is rendered when logging
+    args['key'] = 'after'
+    handler.close()
+    assert read_lines(path) == ["value: {'key': 'before'}"]
+
+
+def test_drop_debug_first(tmp_path):
+    path = str(tmp_path / 'test.log')
+    handler = loghandler.AsyncFileHandler(path, queue_size=3, batch_size=100, flush_interval=60)
+    logger = make_logger(handler, 'test_loghandler.drop')
+    logger.debug('debug 1')
+    logger.info('info 1')
+    logger.debug('debug 2')
+    logger.warning('warning 1')
+    logger.info('info 2')
+    logger.debug('debug 3')
+    logger.error('error 1')
+    handler.close()
+    assert read_lines(path) == ['info 1', 'warning 1', 'info 2', 'error 1', '3 log records dropped, log buffer is full']
+
+
+@pytest.mark.parametrize('log_before_patch', [False, True])
+def test_fork_and_gevent_patch(tmp_path, log_before_patch):
+    # same as gunicorn gevent worker: handler is created in master, worker forks then patches by gevent
+    path = str(tmp_path / 'test.log')
+    code = '''
+    import logging
+    import os
+    from wecubek8s.common.loghandler import AsyncFileHandler
+
+    handler = AsyncFileHandler(%r, flush_interval=0.05)
+    logger = logging.getLogger('worker')
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.info('master')
+    pid = os.fork()
+    if pid == 0:
+        if %r:
+            logger.info('booting worker')
+        from gevent import monkey
+        monkey.patch_all()
+        import gevent
+        for i in range(300):
+            logger.info('worker %%d', i)
+            if i %% 100 == 0:
+                gevent.sleep(0.1)
+        handler.close()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    handler.close()
+    ''' % (path, log_before_patch)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT_PATH] + [p for p in sys.path if p])
+    proc = subprocess.run([sys.executable, '-c', textwrap.dedent(code)],
+                          cwd=ROOT_PATH,
+                          env=env,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT,
+                          timeout=30)
+    assert proc.returncode == 0, proc.stdout.decode('utf-8', 'replace')
+    lines = read_lines(path)
+    expected = ['master'] + (['booting worker'] if log_before_patch else []) + ['worker %d' % i for i in range(300)]
+    assert sorted(lines) == sorted(expected)
@@ -0,0 +1,76 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+from types import SimpleNamespace
+
+import prometheus_client
+import pytest
+from kubernetes.client.exceptions import ApiException
+
+from wecubek8s.common import k8s
+from wecubek8s.common import metrics
+from wecubek8s.common import ratelimit
+
+
+def sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+
+class FakeApi:
+    def list_namespaced_pod(self, namespace):
+        return SimpleNamespace(items=[1, 2, 3])
+
+    def read_namespaced_pod(self, name, namespace):
+        raise ApiException(status=404)
+
+    def patch_namespaced_pod(self, name, namespace, body):
+        raise ApiException(status=500)
+
+
+@pytest.fixture
+def k8s_client(monkeypatch):
+    monkeypatch.setattr(ratelimit, 'acquire', lambda cluster, kind: True)
+    k8s_client = k8s.Client.__new__(k8s.Client)
+    k8s_client.auth = SimpleNamespace(api_server='https://10.0.0.1:6443')
+    k8s_client.cluster_id = 'metric-cluster'
+    return k8s_client
+
+
+def test_call_observed_by_cluster_id(k8s_client):
+    count = sample('wecubek8s_k8s_request_duration_seconds_count', cluster='metric-cluster',
+                   action='list_namespaced_pod')
+    items = sample('wecubek8s_k8s_response_items_sum', cluster='metric-cluster', action='list_namespaced_pod')
+    k8s_client._call(FakeApi(), 'list_namespaced_pod', 'default')
+    assert sample('wecubek8s_k8s_request_duration_seconds_count', cluster='metric-cluster',
+                  action='list_namespaced_pod') == count + 1
+    assert sample('wecubek8s_k8s_response_items_sum', cluster='metric-cluster',
+                  action='list_namespaced_pod') == items + 3
+    # api_server is never used as label
+    assert sample('wecubek8s_k8s_request_duration_seconds_count', cluster='https://10.0.0.1:6443',
+                  action='list_namespaced_pod') == 0
+
+
+def test_call_errors(k8s_client):
+    not_found = sample('wecubek8s_k8s_request_errors_total', cluster='metric-cluster',
+                       action='read_namespaced_pod', status='404')
+    failed = sample('wecubek8s_k8s_request_errors_total', cluster='metric-cluster',
+                    action='patch_namespaced_pod', status='500')
+    with pytest.raises(ApiException):
+        k8s_client._call(FakeApi(), 'read_namespaced_pod', 'a', 'default')
+    with pytest.raises(ApiException):
+        k8s_client._call(FakeApi(), 'patch_namespaced_pod', 'a', 'default', {})
+    # not found of detail query is expected, not counted as error
+    assert sample('wecubek8s_k8s_request_errors_total', cluster='metric-cluster',
+                  action='read_namespaced_pod', status='404') == not_found
+    assert sample('wecubek8s_k8s_request_errors_total', cluster='metric-cluster',
+                  action='patch_namespaced_pod', status='500') == failed + 1
+
+
+def test_timer():
+    histogram = prometheus_client.Histogram('test_timer_seconds', 'test', ['name'],
+                                            registry=prometheus_client.CollectorRegistry())
+    with pytest.raises(ValueError):
+        with metrics.timer(histogram, 'a'):
+            raise ValueError()
+    assert [s.value for s in histogram.collect()[0].samples if s.name == 'test_timer_seconds_count'] == [1]
@@ -0,0 +1,157 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from wecubek8s.apps.model import api
+
+CLUSTER = {'id': 'c1', 'name': 'cluster1', 'api_server': 'https://127.0.0.1:6443', 'token': 'token'}
+
+
+def raw_pod(uid, resource_version='1'):
+    return {
+        'metadata': {
+            'uid': uid,
+            'name': 'pod-' + uid,
+            'namespace': 'default',
+            'resourceVersion': resource_version,
+            'creationTimestamp': '2024-01-01T00:00:00Z'
+        },
+        'spec': {
+            'nodeName': 'node1'
+        },
+        'status': {
+            'podIP': '10.0.0.1'
+        }
+    }
+
+
+class FakeClient:
+    def __init__(self, pods, resource_version):
+        self.pods = pods
+        self.resource_version = resource_version
+        self.listed = 0
+        self.core_client = SimpleNamespace(list_pod_for_all_namespaces=object())
+
+    def list_all_pod(self, _preload_content=True, **kwargs):
+        self.listed += 1
+        return SimpleNamespace(data=json.dumps({
+            'items': [raw_pod(uid) for uid in self.pods],
+            'metadata': {
+                'resourceVersion': self.resource_version
+            }
+        }))
+
+
+class FakeWatch:
+    events = []
+    calls = []
+
+    def stream(self, func, *args, **kwargs):
+        FakeWatch.calls.append(kwargs)
+        for event in self.events:
+            yield event
+
+    def stop(self):
+        pass
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    events = []
+    monkeypatch.setattr(api.Pod, 'to_dict', classmethod(lambda cls, cluster, item: item.metadata.uid))
+    monkeypatch.setattr(api, 'RawWatch', FakeWatch)
+    FakeWatch.events = []
+    FakeWatch.calls = []
+    return events
+
+
+def notify_func(events):
+    return lambda event, cluster_id, data: events.append((event, data))
+
+
+def test_relist_first_time(notified):
+    state = api.WatchState()
+    api.Pod().relist(CLUSTER, FakeClient(['a', 'b'], '10'), notify_func(notified), state)
+    assert notified == []
+    assert sorted(state.items.keys()) == ['a', 'b']
+    assert state.resource_version == '10'
+
+
+def test_relist_diff(notified):
+    state = api.WatchState()
+    api.Pod().relist(CLUSTER, FakeClient(['a', 'b'], '10'), notify_func(notified), state)
+    api.Pod().relist(CLUSTER, FakeClient(['b', 'c'], '20'), notify_func(notified), state)
+    # events missed while resourceVersion expired
+    assert sorted(notified) == [('POD.ADDED', 'c'), ('POD.DELETED', 'a')]
+    assert sorted(state.items.keys()) == ['b', 'c']
+    assert state.resource_version == '20'
+
+
+def test_watch_resume_from_resource_version(monkeypatch, notified):
+    k8s_client = FakeClient(['a'], '10')
+    monkeypatch.setattr(api.Pod, 'cluster_client', lambda self, cluster: k8s_client)
+    FakeWatch.events = [
+        {'type': 'ADDED', 'raw_object': raw_pod('b', '11')},
+        {'type': 'MODIFIED', 'raw_object': raw_pod('a', '12')},
+        {'type': 'BOOKMARK', 'raw_object': {'metadata': {'resourceVersion': '13'}}},
+        {'type': 'DELETED', 'raw_object': raw_pod('a', '14')},
+    ]
+    state = api.WatchState()
+    api.Pod().watch(CLUSTER, threading.Event(), notify_func(notified), state=state)
+    assert notified == [('POD.ADDED', 'b'), ('POD.DELETED', 'a')]
+    assert list(state.items.keys()) == ['b']
+    assert state.resource_version == '14'
+    assert FakeWatch.calls[-1]['resource_version'] == '10'
+    assert FakeWatch.calls[-1]['allow_watch_bookmarks']
+    # reconnect resumes without relisting
+    FakeWatch.events = []
+    api.Pod().watch(CLUSTER, threading.Event(), notify_func(notified), state=state)
+    assert k8s_client.listed == 1
+    assert FakeWatch.calls[-1]['resource_version'] == '14'
+
+
+def test_watch_expired_relist(monkeypatch, notified):
+    k8s_client = FakeClient(['a', 'b'], '10')
+    monkeypatch.setattr(api.Pod, 'cluster_client', lambda self, cluster: k8s_client)
+    FakeWatch.events = [{'type': 'ERROR', 'raw_object': {'code': 410, 'message': 'too old resource version'}}]
+    state = api.WatchState()
+    api.Pod().watch(CLUSTER, threading.Event(), notify_func(notified), state=state)
+    assert state.resource_version is None
+    k8s_client.pods = ['b', 'c']
+    k8s_client.resource_version = '30'
+    FakeWatch.events = []
+    api.Pod().watch(CLUSTER, threading.Event(), notify_func(notified), state=state)
+    assert k8s_client.listed == 2
+    assert sorted(notified) == [('POD.ADDED', 'c'), ('POD.DELETED', 'a')]
+    assert state.resource_version == '30'
+
+
+def test_pod_from_raw():
+    raw = raw_pod('a')
+    raw['metadata']['labels'] = {'app': 'demo'}
+    raw['metadata']['ownerReferences'] = [{'controller': True, 'kind': 'ReplicaSet', 'uid': 'rs1'}]
+    item = api.Pod.from_raw(raw)
+    assert item.metadata.uid == 'a'
+    assert item.metadata.name == 'pod-a'
+    assert item.metadata.namespace == 'default'
+    assert item.metadata.labels == {'app': 'demo'}
+    assert item.metadata.creation_timestamp.isoformat() == '2024-01-01T00:00:00+00:00'
+    assert item.metadata.owner_references[0].uid == 'rs1'
+    assert item.metadata.owner_references[0].controller
+    assert item.spec.node_name == 'node1'
+    assert item.status.pod_ip == '10.0.0.1'
+
+
+def test_pod_from_raw_missing_fields():
+    item = api.Pod.from_raw({'metadata': {'uid': 'a'}})
+    assert item.metadata.uid == 'a'
+    assert item.metadata.creation_timestamp is None
+    assert item.metadata.owner_references is None
+    assert item.spec.node_name is None
+    assert item.status.pod_ip is None
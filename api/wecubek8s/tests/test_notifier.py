@@ -0,0 +1,322 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import queue
+import threading
+import time
+
+from wecubek8s.common import notifier
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class FlakyHandler:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.calls.append(args)
+            if self.failures > 0:
+                self.failures -= 1
+                raise ValueError('downstream error')
+            self.sent.append(args)
+
+
+def make_notifier(handler, **kwargs):
+    n = notifier.Notifier(handler)
+    n.retry_backoff = 0.01
+    n.retry_backoff_max = 0.01
+    for key, value in kwargs.items():
+        setattr(n, key, value)
+    return n
+
+
+def test_notifier_send_with_retry():
+    handler = FlakyHandler(failures=2)
+    n = make_notifier(handler, workers=2)
+    n.start()
+    try:
+        assert n.put('POD.ADDED', 'c1', 'pod1')
+        assert wait_until(lambda: handler.sent)
+        assert handler.sent == [('POD.ADDED', 'c1', 'pod1')]
+        assert len(handler.calls) == 3
+    finally:
+        n.stop()
+
+
+def test_notifier_give_up_after_max_retries():
+    handler = FlakyHandler(failures=100)
+    n = make_notifier(handler, max_retries=2)
+    assert not n.send(('POD.ADDED', 'c1', 'pod1'))
+    assert len(handler.calls) == 3
+
+
+def test_notifier_backoff():
+    n = notifier.Notifier(FlakyHandler())
+    n.retry_backoff = 1
+    n.retry_backoff_max = 10
+    assert 0.5 <= n.backoff(0) <= 1
+    assert 2 <= n.backoff(2) <= 4
+    assert 5 <= n.backoff(10) <= 10
+
+
+def test_notifier_drop_when_full():
+    n = make_notifier(FlakyHandler(), put_timeout=0.01)
+    n._queue = queue.Queue(1)
+    assert n.put('POD.ADDED', 'c1', 'pod1')
+    # no worker started, queue stays full
+    assert not n.put('POD.ADDED', 'c1', 'pod2')
+    assert n.qsize() == 1
+
+
+def test_notifier_drain_on_stop():
+    handler = FlakyHandler()
+    n = make_notifier(handler, workers=1)
+    for idx in range(5):
+        n.put('POD.ADDED', 'c1', 'pod%d' % idx)
+    n.start()
+    n.stop()
+    assert len(handler.sent) == 5
+
+
+class Emitted:
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, group, items):
+        self.events.append((event, group, [item['id'] for item in items]))
+
+
+def pod(uid, deployment='d1'):
+    return {'id': uid, 'deployment_id': deployment}
+
+
+def make_coalescer(emit, window=5):
+    return notifier.Coalescer(emit,
+                              window,
+                              key_func=lambda data: data['id'],
+                              group_func=lambda data: data['deployment_id'],
+                              opposites={'POD.ADDED': 'POD.DELETED', 'POD.DELETED': 'POD.ADDED'})
+
+
+def test_coalescer_dedupe():
+    emitted = Emitted()
+    coalescer = make_coalescer(emitted)
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.add('POD.ADDED', pod('p1'))
+    assert coalescer.pending() == 1
+    coalescer.flush(force=True)
+    assert emitted.events == [('POD.ADDED', 'd1', ['p1'])]
+
+
+def test_coalescer_opposites_cancel():
+    emitted = Emitted()
+    coalescer = make_coalescer(emitted)
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.add('POD.DELETED', pod('p1'))
+    assert coalescer.pending() == 0
+    coalescer.flush(force=True)
+    assert emitted.events == []
+
+
+def test_coalescer_group():
+    emitted = Emitted()
+    coalescer = make_coalescer(emitted)
+    # rolling restart, new pods never cancel old ones
+    for uid in ('old1', 'old2'):
+        coalescer.add('POD.DELETED', pod(uid))
+    for uid in ('new1', 'new2'):
+        coalescer.add('POD.ADDED', pod(uid))
+    coalescer.add('POD.ADDED', pod('other', deployment='d2'))
+    coalescer.flush(force=True)
+    assert emitted.events == [('POD.DELETED', 'd1', ['old1', 'old2']), ('POD.ADDED', 'd1', ['new1', 'new2']),
+                              ('POD.ADDED', 'd2', ['other'])]
+
+
+def test_coalescer_window(monkeypatch):
+    emitted = Emitted()
+    now = [1000.0]
+    monkeypatch.setattr(notifier.time, 'time', lambda: now[0])
+    coalescer = make_coalescer(emitted, window=5)
+    coalescer.add('POD.ADDED', pod('p1'))
+    now[0] += 3
+    coalescer.add('POD.ADDED', pod('p2'))
+    now[0] += 3
+    coalescer.flush()
+    # p2 is still in window
+    assert emitted.events == [('POD.ADDED', 'd1', ['p1'])]
+    now[0] += 3
+    coalescer.flush()
+    assert emitted.events == [('POD.ADDED', 'd1', ['p1']), ('POD.ADDED', 'd1', ['p2'])]
+
+
+def test_coalescer_disabled():
+    emitted = Emitted()
+    coalescer = make_coalescer(emitted, window=0)
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.add('POD.DELETED', pod('p1'))
+    assert emitted.events == [('POD.ADDED', 'd1', ['p1']), ('POD.DELETED', 'd1', ['p1'])]
+
+
+def test_coalescer_emit_error_isolated():
+    emitted = Emitted()
+
+    def emit(event, group, items):
+        if group == 'd1':
+            raise ValueError('boom')
+        emitted(event, group, items)
+
+    coalescer = make_coalescer(emit)
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.add('POD.ADDED', pod('p2', deployment='d2'))
+    coalescer.flush(force=True)
+    assert emitted.events == [('POD.ADDED', 'd2', ['p2'])]
+    assert coalescer.pending() == 0
+
+
+def test_coalescer_stop_flushes():
+    emitted = Emitted()
+    coalescer = make_coalescer(emitted, window=60)
+    coalescer.start()
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.stop()
+    assert emitted.events == [('POD.ADDED', 'd1', ['p1'])]
+
+
+def test_outbox_fifo(tmp_path):
+    outbox = notifier.Outbox(str(tmp_path / 'outbox.db'))
+    row_ids = outbox.append([['POD.ADDED', 'p1'], ['POD.ADDED', 'p2'], ['POD.ADDED', 'p3']])
+    assert len(row_ids) == 3
+    assert outbox.fetch(2) == [(row_ids[0], ['POD.ADDED', 'p1']), (row_ids[1], ['POD.ADDED', 'p2'])]
+    # inflight rows are excluded
+    assert outbox.fetch(2, {row_ids[0]}) == [(row_ids[1], ['POD.ADDED', 'p2']), (row_ids[2], ['POD.ADDED', 'p3'])]
+    outbox.ack(row_ids[0])
+    assert outbox.count() == 2
+    outbox.close()
+    # durable after reopen
+    outbox = notifier.Outbox(str(tmp_path / 'outbox.db'))
+    assert [row[0] for row in outbox.fetch(10)] == row_ids[1:]
+
+
+def test_outbox_tables_share_file(tmp_path):
+    outbox = notifier.Outbox(str(tmp_path / 'outbox.db'))
+    journal = notifier.Outbox(str(tmp_path / 'outbox.db'), table='coalescer')
+    outbox.append([1, 2])
+    journal.append([3])
+    assert outbox.count() == 2
+    assert [row[1] for row in journal.fetch(10)] == [3]
+
+
+def test_outbox_retry_and_dead_letter(tmp_path):
+    outbox = notifier.Outbox(str(tmp_path / 'outbox.db'))
+    row_id = outbox.append(['poison'])[0]
+    assert outbox.retry(row_id, 60, max_attempts=2)
+    # rescheduled
+    assert outbox.fetch(10) == []
+    assert not outbox.retry(row_id, 60, max_attempts=2)
+    assert outbox.count() == 0
+    dead = outbox._conn.execute('SELECT id, data, attempts FROM outbox_dead').fetchall()
+    assert dead == [(row_id, '"poison"', 2)]
+
+
+def test_outbox_dead_letters_bounded(tmp_path):
+    outbox = notifier.Outbox(str(tmp_path / 'outbox.db'))
+    for row_id in outbox.append(['a', 'b', 'c']):
+        outbox.retry(row_id, 0, max_attempts=1, max_dead=2)
+    assert [row[0] for row in outbox._conn.execute('SELECT data FROM outbox_dead ORDER BY id')] == ['"b"', '"c"']
+
+
+def test_outbox_notifier(tmp_path):
+    handler = FlakyHandler(failures=1)
+    n = notifier.OutboxNotifier(handler, str(tmp_path / 'outbox.db'))
+    n.retry_backoff = 0.01
+    n.retry_backoff_max = 0.01
+    n.flush_interval = 0.01
+    n.put('POD.ADDED', 'c1', 'p1')
+    n.put('POD.DELETED', 'c1', 'p2')
+    n.start()
+    try:
+        assert wait_until(lambda: len(handler.sent) == 2)
+        assert sorted(handler.sent) == [('POD.ADDED', 'c1', 'p1'), ('POD.DELETED', 'c1', 'p2')]
+        assert wait_until(lambda: n.qsize() == 0)
+    finally:
+        n.stop()
+
+
+def test_outbox_notifier_dead_letter(tmp_path):
+    handler = FlakyHandler(failures=100)
+    n = notifier.OutboxNotifier(handler, str(tmp_path / 'outbox.db'))
+    n.max_retries = 0
+    n.retry_backoff_max = 0
+    n.max_attempts = 2
+    n.flush_interval = 0.01
+    n.put('POD.ADDED', 'c1', 'p1')
+    n.start()
+    try:
+        assert wait_until(lambda: n.qsize() == 0)
+        assert len(handler.calls) == 2
+    finally:
+        n.stop()
+
+
+def make_journal_coalescer(emit, path, commit_func=None):
+    return notifier.Coalescer(emit,
+                              60,
+                              key_func=lambda data: data['id'],
+                              group_func=lambda data: data['deployment_id'],
+                              opposites={'POD.ADDED': 'POD.DELETED', 'POD.DELETED': 'POD.ADDED'},
+                              journal=notifier.Outbox(path, table='coalescer'),
+                              commit_func=commit_func)
+
+
+def test_coalescer_journal_replay(tmp_path):
+    path = str(tmp_path / 'outbox.db')
+    coalescer = make_journal_coalescer(Emitted(), path)
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.add('POD.ADDED', pod('p2'))
+    coalescer.add('POD.DELETED', pod('p2'))
+    assert coalescer.journal.count() == 1
+    # crashed in window, events are replayed by the next process
+    emitted = Emitted()
+    coalescer = make_journal_coalescer(emitted, path)
+    coalescer.start()
+    coalescer.stop()
+    assert emitted.events == [('POD.ADDED', 'd1', ['p1'])]
+    assert coalescer.journal.count() == 0
+
+
+def test_coalescer_journal_ack_after_commit(tmp_path):
+    commits = []
+    emitted = Emitted()
+    coalescer = make_journal_coalescer(emitted, str(tmp_path / 'outbox.db'),
+                                       commit_func=lambda: commits.append(coalescer.journal.count()))
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.flush(force=True)
+    assert emitted.events == [('POD.ADDED', 'd1', ['p1'])]
+    # journal is kept until emitted events are committed
+    assert commits == [2]
+    assert coalescer.journal.count() == 0
+
+
+def test_coalescer_journal_kept_if_emit_failed(tmp_path):
+    def emit(event, group, items):
+        raise ValueError('boom')
+
+    coalescer = make_journal_coalescer(emit, str(tmp_path / 'outbox.db'))
+    coalescer.add('POD.ADDED', pod('p1'))
+    coalescer.flush(force=True)
+    assert coalescer.pending() == 0
+    assert coalescer.journal.count() == 1
@@ -0,0 +1,76 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+from types import SimpleNamespace
+
+import pytest
+from talos.core import exceptions as base_ex
+from talos.middlewares import lazy_init
+
+from wecubek8s.middlewares import permission
+
+PERMISSIONS = {
+    'plugin_permissions': ['k8s.plugin.deployment'],
+    'data_permissions': {
+        'k8s.model.cluster': {
+            'get': ['CLUSTER_VIEWER'],
+            'post': ['CLUSTER_ADMIN']
+        },
+        'k8s.model.node': ['CLUSTER_ADMIN']
+    }
+}
+
+
+def make_request(user='user1', permissions=None, method='GET'):
+    return SimpleNamespace(auth_user=user,
+                           auth_permissions=set(permissions or []),
+                           method=method,
+                           relative_uri='/kubernetes/v1/test',
+                           json=None)
+
+
+def resource(name):
+    return SimpleNamespace(name=name)
+
+
+@pytest.fixture
+def middleware(monkeypatch):
+    # middleware is created before config is loaded
+    monkeypatch.setattr(permission, 'CONF', SimpleNamespace())
+    middleware = lazy_init.LazyInit(permission.Permission)
+    monkeypatch.setattr(permission, 'CONF', SimpleNamespace(**PERMISSIONS))
+    return middleware
+
+
+def test_plugin_denied(middleware):
+    with pytest.raises(base_ex.ForbiddenError):
+        middleware.process_resource(make_request(permissions=['SUB_SYSTEM']), None, resource('k8s.plugin.deployment'),
+                                    {})
+    with pytest.raises(base_ex.ForbiddenError):
+        middleware.process_resource(make_request(user='SYS_PLATFORM'), None, resource('k8s.plugin.deployment'), {})
+
+
+def test_plugin_allowed(middleware):
+    middleware.process_resource(make_request(user='SYS_PLATFORM', permissions=['SUB_SYSTEM']), None,
+                                resource('k8s.plugin.deployment'), {})
+    # not configured
+    middleware.process_resource(make_request(), None, resource('k8s.plugin.service'), {})
+
+
+def test_data_permission_by_method(middleware):
+    middleware.process_resource(make_request(permissions=['CLUSTER_VIEWER']), None, resource('k8s.model.cluster'), {})
+    with pytest.raises(base_ex.ForbiddenError):
+        middleware.process_resource(make_request(permissions=['CLUSTER_VIEWER'], method='POST'), None,
+                                    resource('k8s.model.cluster'), {})
+    # method not configured
+    with pytest.raises(base_ex.ForbiddenError):
+        middleware.process_resource(make_request(permissions=['CLUSTER_ADMIN'], method='DELETE'), None,
+                                    resource('k8s.model.cluster'), {})
+
+
+def test_data_permission(middleware):
+    middleware.process_resource(make_request(permissions=['CLUSTER_ADMIN']), None, resource('k8s.model.node'), {})
+    with pytest.raises(base_ex.ForbiddenError):
+        middleware.process_resource(make_request(permissions=['CLUSTER_VIEWER']), None, resource('k8s.model.node'),
+                                    {})
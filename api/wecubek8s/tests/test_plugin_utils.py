@@ -0,0 +1,34 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+from types import SimpleNamespace
+
+from wecubek8s.apps.plugin import utils as api_utils
+from wecubek8s.common import const
+
+
+def test_spec_hash_key_order_independent():
+    template1 = {'metadata': {'name': 'a', 'labels': {'x': '1', 'y': '2'}}, 'spec': {'replicas': 1}}
+    template2 = {'spec': {'replicas': 1}, 'metadata': {'labels': {'y': '2', 'x': '1'}, 'name': 'a'}}
+    assert api_utils.spec_hash(template1) == api_utils.spec_hash(template2)
+    template2['spec']['replicas'] = 2
+    assert api_utils.spec_hash(template1) != api_utils.spec_hash(template2)
+
+
+def test_set_spec_hash():
+    template = {'metadata': {'name': 'a'}, 'spec': {'replicas': 1}}
+    expected = api_utils.spec_hash(template)
+    assert api_utils.set_spec_hash(template, const.Annotation.SPEC_HASH) == expected
+    assert template['metadata']['annotations'][const.Annotation.SPEC_HASH] == expected
+    # rendered again from the same input, the hash is stable
+    template = {'metadata': {'name': 'a'}, 'spec': {'replicas': 1}}
+    assert api_utils.set_spec_hash(template, const.Annotation.SPEC_HASH) == expected
+
+
+def test_get_annotation():
+    resource = SimpleNamespace(metadata=SimpleNamespace(annotations={const.Annotation.SPEC_HASH: 'abc'}))
+    assert api_utils.get_annotation(resource, const.Annotation.SPEC_HASH) == 'abc'
+    assert api_utils.get_annotation(SimpleNamespace(metadata=SimpleNamespace(annotations=None)),
+                                    const.Annotation.SPEC_HASH) is None
+    assert api_utils.get_annotation(None, const.Annotation.SPEC_HASH) is None
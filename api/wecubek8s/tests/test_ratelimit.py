@@ -0,0 +1,64 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import pytest
+
+from wecubek8s.common import ratelimit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: now[0])
+    return now
+
+
+def test_burst(tmp_path, clock):
+    bucket = ratelimit.TokenBucket(str(tmp_path / 'bucket'), qps=10, burst=5)
+    assert [bucket.reserve(0) for _ in range(5)] == [0.0] * 5
+    # bucket is empty, no waiting allowed
+    assert bucket.reserve(0) is None
+
+
+def test_reserve_wait(tmp_path, clock):
+    bucket = ratelimit.TokenBucket(str(tmp_path / 'bucket'), qps=10, burst=1)
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == pytest.approx(0.1)
+    # waiting callers reserve tokens in order
+    assert bucket.reserve(1) == pytest.approx(0.2)
+    assert bucket.reserve(0.25) is None
+    # rejected reservation does not take token
+    assert bucket.reserve(1) == pytest.approx(0.3)
+
+
+def test_refill(tmp_path, clock):
+    bucket = ratelimit.TokenBucket(str(tmp_path / 'bucket'), qps=10, burst=2)
+    bucket.reserve(0)
+    bucket.reserve(0)
+    clock[0] += 0.1
+    assert bucket.reserve(0) == 0.0
+    assert bucket.reserve(0) is None
+    # refill never exceeds burst
+    clock[0] += 100
+    assert [bucket.reserve(0) for _ in range(3)] == [0.0, 0.0, None]
+
+
+@pytest.mark.skipif(not ratelimit.HAS_FCNTL, reason='state is shared by file only with fcntl')
+def test_state_shared_by_file(tmp_path, clock):
+    bucket1 = ratelimit.TokenBucket(str(tmp_path / 'bucket'), qps=10, burst=2)
+    bucket2 = ratelimit.TokenBucket(str(tmp_path / 'bucket'), qps=10, burst=2)
+    assert bucket1.reserve(0) == 0.0
+    assert bucket2.reserve(0) == 0.0
+    assert bucket1.reserve(0) is None
+
+
+def test_acquire_rejected(monkeypatch, tmp_path, clock):
+    bucket = ratelimit.TokenBucket(str(tmp_path / 'bucket'), qps=1, burst=1)
+    monkeypatch.setattr(ratelimit, 'get_bucket', lambda cluster, kind: bucket)
+    # default max_wait is 10s
+    assert ratelimit.acquire('c1', ratelimit.READ)
+    monkeypatch.setattr(ratelimit.time, 'sleep', lambda seconds: None)
+    for _ in range(10):
+        assert ratelimit.acquire('c1', ratelimit.READ)
+    assert not ratelimit.acquire('c1', ratelimit.READ)
@@ -0,0 +1,137 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from wecubek8s.common import rollout
+
+
+def make_deployment(name, replicas=1, updated=1, available=1, total=None, generation=1, observed=1, conditions=None):
+    return SimpleNamespace(metadata=SimpleNamespace(namespace='default', name=name, generation=generation,
+                                                    resource_version='1'),
+                           spec=SimpleNamespace(replicas=replicas),
+                           status=SimpleNamespace(observed_generation=observed,
+                                                  updated_replicas=updated,
+                                                  available_replicas=available,
+                                                  replicas=updated if total is None else total,
+                                                  conditions=conditions))
+
+
+class FakeWatch:
+    events = []
+
+    def __init__(self):
+        self.stopped = False
+
+    def stream(self, func, **kwargs):
+        for event in list(self.events):
+            if self.stopped:
+                return
+            yield event
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeClient:
+    def __init__(self, cluster_id, token='token', current=None):
+        self.cluster_id = cluster_id
+        self.auth = SimpleNamespace(api_server='https://127.0.0.1:6443', token=token)
+        self.app_client = SimpleNamespace(list_deployment_for_all_namespaces=None)
+        self.current = current
+        self.listed = 0
+
+    def get_deployment(self, name, namespace):
+        return self.current
+
+    def list_all_deployment(self):
+        self.listed += 1
+        return SimpleNamespace(items=[], metadata=SimpleNamespace(resource_version='1'))
+
+
+@pytest.fixture(autouse=True)
+def clean_watchers(monkeypatch):
+    monkeypatch.setattr(rollout, '_WATCHERS', {})
+    monkeypatch.setattr(rollout, 'watch', SimpleNamespace(Watch=FakeWatch))
+    FakeWatch.events = []
+
+
+def test_rollout_complete():
+    assert rollout.rollout_complete('MODIFIED', make_deployment('a')) == rollout.COMPLETE
+    assert rollout.rollout_complete('MODIFIED', make_deployment('a', observed=0)) is None
+    assert rollout.rollout_complete('MODIFIED', make_deployment('a', replicas=2, updated=1)) is None
+    assert rollout.rollout_complete('MODIFIED', make_deployment('a', updated=1, total=2)) is None
+    assert rollout.rollout_complete('MODIFIED', make_deployment('a', available=0)) is None
+    assert rollout.rollout_complete('DELETED', make_deployment('a')) is None
+
+
+def test_rollout_progress_deadline_exceeded():
+    condition = SimpleNamespace(type='Progressing', reason='ProgressDeadlineExceeded')
+    item = make_deployment('a', available=0, conditions=[condition])
+    assert rollout.rollout_complete('MODIFIED', item) == rollout.FAILED
+
+
+def test_deletion_complete():
+    assert rollout.deletion_complete('DELETED', make_deployment('a')) == rollout.COMPLETE
+    assert rollout.deletion_complete(rollout.SYNC, None) == rollout.COMPLETE
+    assert rollout.deletion_complete('MODIFIED', make_deployment('a')) is None
+
+
+def test_wait_ready_before_watch():
+    client = FakeClient('c1', current=make_deployment('a'))
+    assert rollout.wait_for_rollout(client, 'default', 'a', 1) == rollout.COMPLETE
+
+
+def test_wait_by_watch_event():
+    FakeWatch.events = [{'type': 'MODIFIED', 'object': make_deployment('a', updated=0)},
+                        {'type': 'MODIFIED', 'object': make_deployment('a')}]
+    client = FakeClient('c1', current=make_deployment('a', updated=0))
+    assert rollout.wait_for_rollout(client, 'default', 'a', 5) == rollout.COMPLETE
+
+
+def test_wait_timeout():
+    client = FakeClient('c1', current=make_deployment('a', updated=0))
+    assert rollout.wait_for_rollout(client, 'default', 'a', 0.1) is None
+
+
+def test_watcher_per_cluster():
+    client = FakeClient('c1')
+    watcher = rollout.get_deployment_watcher(client)
+    assert rollout.get_deployment_watcher(client) is watcher
+    assert rollout.get_deployment_watcher(FakeClient('c2')) is not watcher
+
+
+def test_watcher_token_rotated():
+    old_client = FakeClient('c1', token='old')
+    watcher = rollout.get_deployment_watcher(old_client)
+    new_client = FakeClient('c1', token='new')
+    assert rollout.get_deployment_watcher(new_client) is watcher
+    assert watcher.k8s_client is new_client
+    assert len(rollout._WATCHERS) == 1
+
+
+def test_watch_restarts_with_new_client():
+    old_client = FakeClient('c1', token='old', current=make_deployment('a', updated=0))
+    new_client = FakeClient('c1', token='new', current=make_deployment('a', updated=0))
+    watcher = rollout.get_deployment_watcher(old_client)
+    swapped = threading.Event()
+
+    class SwappingWatch(FakeWatch):
+        def stream(self, func, **kwargs):
+            if watcher.k8s_client is old_client:
+                rollout.get_deployment_watcher(new_client)
+                swapped.set()
+                yield {'type': 'MODIFIED', 'object': make_deployment('b')}
+                # never reached, stream of stale client must be stopped
+                yield {'type': 'MODIFIED', 'object': make_deployment('a')}
+            else:
+                yield {'type': 'MODIFIED', 'object': make_deployment('a')}
+
+    rollout.watch.Watch = SwappingWatch
+    assert watcher.wait('default', 'a', rollout.rollout_complete, 5) == rollout.COMPLETE
+    assert swapped.is_set()
+    assert new_client.listed == 1
@@ -0,0 +1,182 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import collections
+import datetime
+
+import pytest
+import sqlalchemy
+from sqlalchemy.orm import sessionmaker
+from talos.db import pool
+
+from wecubek8s.common import sharding
+from wecubek8s.db import models
+from wecubek8s.db import resource as db_resource
+
+
+def test_hash_ring_empty():
+    assert sharding.HashRing([]).get('c1') is None
+
+
+def test_hash_ring_stable():
+    ring1 = sharding.HashRing(['w1', 'w2', 'w3'])
+    ring2 = sharding.HashRing(['w3', 'w1', 'w2', 'w1'])
+    keys = ['cluster-%d' % idx for idx in range(100)]
+    assert [ring1.get(key) for key in keys] == [ring2.get(key) for key in keys]
+
+
+def test_hash_ring_balanced():
+    ring = sharding.HashRing(['w1', 'w2', 'w3'])
+    counter = collections.Counter([ring.get('cluster-%d' % idx) for idx in range(3000)])
+    assert set(counter.keys()) == {'w1', 'w2', 'w3'}
+    assert min(counter.values()) > 600
+
+
+def test_hash_ring_minimal_moves():
+    keys = ['cluster-%d' % idx for idx in range(1000)]
+    ring = sharding.HashRing(['w1', 'w2', 'w3'])
+    new_ring = sharding.HashRing(['w1', 'w2', 'w3', 'w4'])
+    moved = [key for key in keys if ring.get(key) != new_ring.get(key)]
+    # only keys taken over by the new member move
+    assert all([new_ring.get(key) == 'w4' for key in moved])
+    assert len(moved) < 400
+
+
+class FakeMember:
+    members = set()
+
+    def heartbeat(self, member_id, ttl):
+        pass
+
+    def alive(self):
+        return list(self.members)
+
+
+class FakeLease:
+    held = {}
+    error = None
+
+    def acquire(self, lease_id, owner, ttl):
+        return self.held.setdefault(lease_id, owner) == owner
+
+    def renew(self, owner, lease_ids, ttl):
+        if self.error:
+            raise self.error
+        return set([lease_id for lease_id in lease_ids if self.held.get(lease_id) == owner])
+
+    def release(self, owner, lease_ids):
+        for lease_id in lease_ids:
+            self.held.pop(lease_id, None)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    FakeMember.members = set()
+    FakeLease.held = {}
+    FakeLease.error = None
+    monkeypatch.setattr(sharding.db_resource, 'WatcherMember', FakeMember)
+    monkeypatch.setattr(sharding.db_resource, 'WatcherLease', FakeLease)
+    now = [1000.0]
+    monkeypatch.setattr(sharding.time, 'time', lambda: now[0])
+    return now
+
+
+def test_shard_manager_members_changed(fake_db):
+    shard = sharding.ShardManager('w1')
+    assert all([shard.owns('cluster-%d' % idx) for idx in range(20)])
+    FakeMember.members = {'w1', 'w2'}
+    fake_db[0] += 10
+    shard.heartbeat()
+    assert shard.ring.nodes == ['w1', 'w2']
+    owned = [shard.owns('cluster-%d' % idx) for idx in range(20)]
+    assert any(owned) and not all(owned)
+
+
+def test_shard_manager_lease(fake_db):
+    shard1 = sharding.ShardManager('w1')
+    shard2 = sharding.ShardManager('w2')
+    assert shard1.acquire('c1')
+    assert not shard2.acquire('c1')
+    shard1.release('c1')
+    assert shard2.acquire('c1')
+    assert shard2.leases == {'c1'}
+
+
+def test_shard_manager_lease_lost(fake_db):
+    shard = sharding.ShardManager('w1')
+    shard.acquire('c1')
+    shard.acquire('c2')
+    # taken over by others after expired
+    FakeLease.held['c2'] = 'w2'
+    fake_db[0] += 10
+    assert shard.heartbeat() == {'c2'}
+    assert shard.leases == {'c1'}
+
+
+def test_shard_manager_db_unavailable(fake_db):
+    shard = sharding.ShardManager('w1')
+    shard.acquire('c1')
+    FakeLease.error = RuntimeError('db is down')
+    fake_db[0] += 10
+    # leases are kept until lease_ttl
+    assert shard.heartbeat() == set()
+    assert shard.leases == {'c1'}
+    fake_db[0] += 30
+    assert shard.heartbeat() == {'c1'}
+    assert shard.leases == set()
+
+
+@pytest.fixture
+def dbpool(tmp_path):
+    engine = sqlalchemy.create_engine('sqlite:///%s' % (tmp_path / 'test.db'))
+    # same as DBPool.reflesh, without reading config
+    dbpool = pool.DBPool()
+    dbpool._pool = sessionmaker(bind=engine, autocommit=True)
+    models.WatcherMember.__table__.create(engine)
+    models.WatcherLease.__table__.create(engine)
+    return dbpool
+
+
+def expire_lease(dbpool, lease_id):
+    with db_resource.WatcherLease(dbpool=dbpool).transaction() as session:
+        session.query(models.WatcherLease).filter(models.WatcherLease.id == lease_id).update(
+            {'expire_time': datetime.datetime(2000, 1, 1)}, synchronize_session=False)
+
+
+def test_watcher_lease(dbpool):
+    lease = db_resource.WatcherLease(dbpool=dbpool)
+    assert lease.acquire('c1', 'w1', 30)
+    assert lease.acquire('c1', 'w1', 30)
+    assert not lease.acquire('c1', 'w2', 30)
+    assert lease.renew('w1', {'c1', 'c2'}, 30) == {'c1'}
+    assert lease.renew('w2', {'c1'}, 30) == set()
+    expire_lease(dbpool, 'c1')
+    # expired lease can be taken over, and is lost by previous owner
+    assert lease.acquire('c1', 'w2', 30)
+    assert lease.renew('w1', {'c1'}, 30) == set()
+    lease.release('w1', ['c1'])
+    assert not lease.acquire('c1', 'w1', 30)
+    lease.release('w2', ['c1'])
+    assert lease.acquire('c1', 'w1', 30)
+
+
+def test_watcher_lease_expire_time_by_db(dbpool):
+    lease = db_resource.WatcherLease(dbpool=dbpool)
+    lease.acquire('c1', 'w1', 30)
+    with lease.transaction() as session:
+        now = db_resource.db_now(session)
+    expire_time = lease.get('c1')['expire_time']
+    assert abs((expire_time - now).total_seconds() - 30) < 5
+
+
+def test_watcher_member(dbpool):
+    member = db_resource.WatcherMember(dbpool=dbpool)
+    member.heartbeat('w1', 30)
+    member.heartbeat('w2', 30)
+    member.heartbeat('w2', 30)
+    assert sorted(member.alive()) == ['w1', 'w2']
+    with member.transaction() as session:
+        session.query(models.WatcherMember).filter(models.WatcherMember.id == 'w1').update(
+            {'expire_time': datetime.datetime(2000, 1, 1)}, synchronize_session=False)
+    assert member.alive() == ['w2']
@@ -0,0 +1,84 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import http.server
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from wecubek8s.common import utils
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({'cookie': self.headers.get('Cookie', None)}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'accessToken=%s; Path=/' % self.path.strip('/'))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d' % httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_get_session_shared(server):
+    assert utils.get_session(server + '/a') is utils.get_session(server + '/b?x=1')
+    assert utils.get_session(server + '/a') is not utils.get_session('http://127.0.0.2:1/a')
+
+
+def test_session_cookies_not_kept(server):
+    # Set-Cookie of user1 must never be sent with request of user2
+    assert utils.RestfulJson.get(server + '/user1') == {'cookie': None}
+    assert utils.RestfulJson.get(server + '/user2') == {'cookie': None}
+    assert len(utils.get_session(server).cookies) == 0
+
+
+def test_explicit_cookies(server):
+    assert utils.RestfulJson.get(server + '/user1', cookies={'lang': 'en'}) == {'cookie': 'lang=en'}
+
+
+def test_lazy_module(tmp_path, monkeypatch):
+    (tmp_path / 'lazy_module_sample.py').write_text('VALUE = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = utils.LazyModule('lazy_module_sample')
+    assert 'lazy_module_sample' not in sys.modules
+    assert module.VALUE == 1
+    assert 'lazy_module_sample' in sys.modules
+    monkeypatch.delitem(sys.modules, 'lazy_module_sample')
+
+
+def test_lazy_module_not_found():
+    module = utils.LazyModule('wecubek8s.not_exist')
+    with pytest.raises(ImportError):
+        module.anything
+
+
+def test_kubernetes_imported_lazily():
+    code = ('import sys; '
+            'from wecubek8s.common import k8s, rollout; '
+            'from wecubek8s.apps.model import api; '
+            'api.RawWatch.get_return_type; '
+            'print("kubernetes" in sys.modules)')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT_PATH] + [p for p in sys.path if p])
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT_PATH, env=env, timeout=60)
+    assert output.decode('utf-8').split()[-1] == 'False'
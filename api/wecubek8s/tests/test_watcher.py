@@ -0,0 +1,146 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(ROOT_PATH, 'etc', 'wecubek8s.conf')
+# watcher patches everything by gevent on import, so it is tested in a fresh interpreter
+PRELUDE = '''
+import sys
+import types
+from talos.server import base
+from wecubek8s.server import base as wecubek8s_base
+base.initialize_config(%r)
+# logger & db are not required
+sys.modules['wecubek8s.server.bootstrap'] = types.ModuleType('wecubek8s.server.bootstrap')
+from wecubek8s.server import watcher
+import gevent
+''' % CONFIG_PATH
+
+
+def run_watcher_script(code, timeout=60):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT_PATH] + [p for p in sys.path if p])
+    proc = subprocess.run([sys.executable, '-c', PRELUDE + textwrap.dedent(code)],
+                          cwd=ROOT_PATH,
+                          env=env,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT,
+                          timeout=timeout)
+    assert proc.returncode == 0, proc.stdout.decode('utf-8', 'replace')
+    return proc.stdout.decode('utf-8', 'replace')
+
+
+def test_watch_clusters():
+    run_watcher_script('''
+    class FakeShard:
+        def __init__(self):
+            self.leases = set()
+            self.lost = set()
+
+        def heartbeat(self):
+            lost, self.lost = self.lost, set()
+            self.leases -= lost
+            return lost
+
+        def owns(self, cluster_id):
+            return cluster_id != 'other'
+
+        def acquire(self, cluster_id):
+            self.leases.add(cluster_id)
+            return True
+
+        def release(self, cluster_id):
+            self.leases.discard(cluster_id)
+
+    clusters = [{'id': 'c1', 'api_server': 's1'}, {'id': 'c2', 'api_server': 's2'}, {'id': 'other'}]
+    running = set()
+
+    def watch_pod(cluster, event_stop, namespace=None):
+        running.add(cluster['id'])
+        try:
+            while not event_stop.is_set():
+                gevent.sleep(0.01)
+        finally:
+            running.discard(cluster['id'])
+
+    watcher.watch_pod = watch_pod
+    watcher.api.db_resource.Cluster = lambda: types.SimpleNamespace(list=lambda: clusters)
+    shard = FakeShard()
+    mapping = {}
+    watcher.watch_clusters(shard, mapping)
+    gevent.sleep(0.05)
+    # all cluster watches are greenlets of one loop
+    assert sorted(mapping.keys()) == ['c1', 'c2'], mapping
+    assert running == {'c1', 'c2'}, running
+    assert shard.leases == {'c1', 'c2'}
+
+    # modified & deleted
+    old_greenlets = mapping['c1'][2]
+    clusters = [{'id': 'c1', 'api_server': 's1-new'}]
+    watcher.watch_clusters(shard, mapping)
+    gevent.sleep(0.05)
+    assert sorted(mapping.keys()) == ['c1'], mapping
+    assert mapping['c1'][0]['api_server'] == 's1-new'
+    assert all([g.dead for g in old_greenlets])
+    assert running == {'c1'}, running
+    assert shard.leases == {'c1'}
+
+    # lease lost
+    shard.lost = {'c1'}
+    shard.acquire = lambda cluster_id: False
+    watcher.watch_clusters(shard, mapping)
+    gevent.sleep(0.05)
+    assert mapping == {}, mapping
+    assert running == set(), running
+    ''')
+
+
+def test_start_watch_per_namespace():
+    run_watcher_script('''
+    namespaces = []
+    watcher.watch_pod = lambda cluster, event_stop, namespace=None: namespaces.append(namespace)
+    watcher.CONF = types.SimpleNamespace(watcher=types.SimpleNamespace(namespaces=['ns1', 'ns2']))
+    cluster, event_stop, greenlets = watcher.start_watch({'id': 'c1'})
+    gevent.joinall(greenlets)
+    assert sorted(namespaces) == ['ns1', 'ns2'], namespaces
+    ''')
+
+
+def test_watch_selectors():
+    run_watcher_script('''
+    assert watcher.watch_selectors() == {'label_selector': None, 'field_selector': None}
+    watcher.CONF = types.SimpleNamespace(watcher=types.SimpleNamespace(
+        label_selector='app.kubernetes.io/managed-by=wecube',
+        field_selector='status.phase!=Succeeded',
+        exclude_namespaces=['kube-system', 'kube-public']))
+    assert watcher.watch_selectors() == {
+        'label_selector': 'app.kubernetes.io/managed-by=wecube',
+        'field_selector': 'status.phase!=Succeeded,metadata.namespace!=kube-system,metadata.namespace!=kube-public'
+    }, watcher.watch_selectors()
+    ''')
+
+
+def test_observe_pod_event():
+    run_watcher_script('''
+    import datetime
+    import time
+    import prometheus_client
+
+    def sample(name, **labels):
+        return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+    created = datetime.datetime.fromtimestamp(time.time() - 10, tz=datetime.timezone.utc)
+    item = types.SimpleNamespace(metadata=types.SimpleNamespace(creation_timestamp=created))
+    watcher.observe_pod_event('c1', 'ADDED', item)
+    watcher.observe_pod_event('c1', 'BOOKMARK', None)
+    assert sample('wecubek8s_watch_events_total', cluster='c1', type='ADDED') == 1
+    assert sample('wecubek8s_watch_events_total', cluster='c1', type='BOOKMARK') == 1
+    assert sample('wecubek8s_watch_event_lag_seconds_count', cluster='c1') == 1
+    assert sample('wecubek8s_watch_event_lag_seconds_sum', cluster='c1') >= 10
+    ''')
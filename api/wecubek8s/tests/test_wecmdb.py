@@ -0,0 +1,104 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import threading
+
+import pytest
+
+from wecubek8s.common import exceptions
+from wecubek8s.common import wecmdb
+
+NO_VALUE = object()
+
+
+class FakeCache:
+    def __init__(self):
+        self.items = {}
+
+    def get(self, key, expires=None):
+        return self.items.get(key, NO_VALUE)
+
+    def set(self, key, value):
+        self.items[key] = value
+
+    def validate(self, value):
+        return value is not NO_VALUE
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def post(url, headers=None, json=None):
+        with lock:
+            calls.append(json)
+        if any([item.get('fail') == 'chunk' for item in json]):
+            raise exceptions.PluginError(message='chunk failed')
+        results = [dict(item, id='id-' + item['name']) for item in json if not item.get('fail')]
+        errors = [dict(item, errorMessage='invalid ' + item['name']) for item in json if item.get('fail')]
+        if errors:
+            return {'statusCode': 'ERROR', 'statusMessage': 'error', 'data': results + errors}
+        return {'statusCode': 'OK', 'data': results}
+
+    monkeypatch.setattr(wecmdb.utils.RestfulJson, 'post', staticmethod(post))
+    return calls
+
+
+def test_bulk_chunks_keep_order(posts):
+    client = wecmdb.WeCMDBClient('http://wecmdb', token='token')
+    data = [{'name': str(idx)} for idx in range(10)]
+    result = client.create_bulk('app', data, chunk_size=3, concurrency=4)
+    assert sorted([len(chunk) for chunk in posts]) == [1, 3, 3, 3]
+    assert result['statusCode'] == 'OK'
+    assert [item['id'] for item in result['data']] == ['id-%d' % idx for idx in range(10)]
+    assert result['errors'] == []
+
+
+def test_bulk_partial_errors(posts):
+    client = wecmdb.WeCMDBClient('http://wecmdb', token='token')
+    data = [{'name': 'a'}, {'name': 'b', 'fail': 'item'}, {'name': 'c', 'fail': 'chunk'}, {'name': 'd'}]
+    result = client.update_bulk('app', data, chunk_size=2, concurrency=2)
+    assert result['statusCode'] == 'ERROR'
+    assert [item['id'] for item in result['data']] == ['id-a']
+    assert [error['errorMessage'] for error in result['errors']] == ['invalid b', 'chunk failed', 'chunk failed']
+    assert [error['data']['name'] for error in result['errors']] == ['b', 'c', 'd']
+
+
+@pytest.fixture
+def metadata_gets(monkeypatch):
+    monkeypatch.setattr(wecmdb, 'cache', FakeCache())
+    calls = []
+
+    def post(self, url, data, param=None):
+        calls.append((self.token, url, data))
+        return {'statusCode': 'OK', 'data': [len(calls)]}
+
+    monkeypatch.setattr(wecmdb.WeCMDBClient, 'post', post)
+    return calls
+
+
+def test_metadata_cached(metadata_gets):
+    client = wecmdb.WeCMDBClient('http://wecmdb', token='token1')
+    assert client.citypes({'filters': []}) == client.citypes({'filters': []})
+    assert len(metadata_gets) == 1
+    client.citypes({'filters': [{'name': 'id'}]})
+    client.enumcodes({'filters': []})
+    assert len(metadata_gets) == 3
+
+
+def test_metadata_cached_by_token(metadata_gets):
+    wecmdb.WeCMDBClient('http://wecmdb', token='token1').citypes({})
+    wecmdb.WeCMDBClient('http://wecmdb', token='token2').citypes({})
+    assert [call[0] for call in metadata_gets] == ['token1', 'token2']
+    # raw token never appears in cache keys
+    assert not [key for key in wecmdb.cache.items if 'token1' in key or 'token2' in key]
+
+
+def test_metadata_invalidate(metadata_gets):
+    client = wecmdb.WeCMDBClient('http://wecmdb', token='token1')
+    client.citypes({})
+    wecmdb.WeCMDBClient.invalidate_metadata()
+    client.citypes({})
+    assert len(metadata_gets) == 2
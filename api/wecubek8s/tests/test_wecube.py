@@ -0,0 +1,67 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+from types import SimpleNamespace
+
+import pytest
+from talos.core import exceptions as base_ex
+
+from wecubek8s.common import wecube
+
+
+@pytest.fixture
+def logins(monkeypatch):
+    tokens = []
+
+    def login_subsystem_token(self):
+        tokens.append('token-%d' % len(tokens))
+        return tokens[-1], expire_at[0]
+
+    expire_at = [10000.0]
+    monkeypatch.setattr(wecube.WeCubeClient, 'login_subsystem_token', login_subsystem_token)
+    monkeypatch.setattr(wecube.time, 'time', lambda: 1000.0)
+    return SimpleNamespace(tokens=tokens, expire_at=expire_at)
+
+
+def test_token_cached(logins):
+    manager = wecube.TokenManager()
+    assert manager.get('http://wecube') == 'token-0'
+    assert manager.get('http://wecube') == 'token-0'
+    assert manager.get('http://other') == 'token-1'
+    assert len(logins.tokens) == 2
+
+
+def test_token_refresh_ahead(logins):
+    manager = wecube.TokenManager()
+    # expires within wecube.token_refresh_ahead(60s)
+    logins.expire_at[0] = 1030.0
+    assert manager.get('http://wecube') == 'token-0'
+    assert manager.get('http://wecube') == 'token-1'
+
+
+def test_token_invalidate(logins):
+    manager = wecube.TokenManager()
+    assert manager.get('http://wecube') == 'token-0'
+    # refreshed by others already, keep it
+    manager.invalidate('http://wecube', 'stale')
+    assert manager.get('http://wecube') == 'token-0'
+    manager.invalidate('http://wecube', 'token-0')
+    assert manager.get('http://wecube') == 'token-1'
+
+
+def test_post_as_subsystem_retry_on_auth_error(monkeypatch, logins):
+    monkeypatch.setattr(wecube, 'TOKENS', wecube.TokenManager())
+    used_tokens = []
+
+    def post(self, url, data, param=None):
+        used_tokens.append(self.token)
+        if self.token == 'token-0':
+            raise base_ex.AuthError()
+        return {'status': 'OK'}
+
+    monkeypatch.setattr(wecube.WeCubeClient, 'post', post)
+    client = wecube.WeCubeClient('http://wecube', None)
+    assert client.post_as_subsystem('http://wecube/api', {}) == {'status': 'OK'}
+    assert used_tokens == ['token-0', 'token-1']
+    assert wecube.TOKENS.get('http://wecube') == 'token-1'
@@ -0,0 +1,45 @@
+# coding=utf-8
+"""
+benchmark of process startup, import time and max RSS of each module in a fresh interpreter
+
+usage: python tools/bench_startup.py [module ...]
+"""
+
+from __future__ import absolute_import
+
+import subprocess
+import sys
+
+DEFAULT_MODULES = [
+    'wecubek8s.server.wsgi_server',
+    'wecubek8s.server.bootstrap',
+    'wecubek8s.server.scheduler',
+    'wecubek8s.server.watcher',
+]
+SCRIPT = '''
+import resource, time
+start = time.time()
+__import__(%r)
+print('%%.3f %%d' %% (time.time() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+'''
+
+
+def measure(module, repeat=5):
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT % module], stderr=subprocess.DEVNULL)
+        cost, rss = output.decode('utf-8').split()[-2:]
+        results.append((float(cost), int(rss)))
+    results.sort()
+    return results[len(results) // 2]
+
+
+def main():
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    for module in modules:
+        cost, rss = measure(module)
+        print('%-40s %8.3fs %8.1fMB' % (module, cost, rss / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
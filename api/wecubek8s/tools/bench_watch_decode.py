@@ -0,0 +1,98 @@
+# coding=utf-8
+"""
+benchmark of pod watch event decoding, events per second on single core
+
+usage: python tools/bench_watch_decode.py [count]
+"""
+
+from __future__ import absolute_import
+
+import json
+import sys
+import time
+
+from kubernetes import client
+from kubernetes import watch
+
+from wecubek8s.apps.model import api
+
+
+def make_event(index):
+    pod = {
+        'apiVersion': 'v1',
+        'kind': 'Pod',
+        'metadata': {
+            'name': 'app-%d' % index,
+            'namespace': 'default',
+            'uid': 'uid-%d' % index,
+            'resourceVersion': str(10000 + index),
+            'creationTimestamp': '2023-01-01T00:00:00Z',
+            'labels': {
+                'app': 'app',
+                'wecube-pod-auto-tag': 'app',
+                'pod-template-hash': 'abcdef'
+            },
+            'ownerReferences': [{
+                'apiVersion': 'apps/v1',
+                'kind': 'ReplicaSet',
+                'name': 'app-abcdef',
+                'uid': 'rs-uid',
+                'controller': True,
+                'blockOwnerDeletion': True
+            }]
+        },
+        'spec': {
+            'nodeName': 'node-1',
+            'containers': [{
+                'name': 'app',
+                'image': 'nginx:latest',
+                'ports': [{
+                    'containerPort': 80,
+                    'protocol': 'TCP'
+                }],
+                'env': [{
+                    'name': 'ENV_%d' % i,
+                    'value': 'value'
+                } for i in range(10)],
+                'resources': {
+                    'limits': {
+                        'cpu': '1',
+                        'memory': '1Gi'
+                    }
+                }
+            }]
+        },
+        'status': {
+            'phase': 'Running',
+            'podIP': '10.0.0.1',
+            'hostIP': '192.168.0.1',
+            'startTime': '2023-01-01T00:00:00Z',
+            'conditions': [{
+                'type': 'Ready',
+                'status': 'True',
+                'lastTransitionTime': '2023-01-01T00:00:00Z'
+            }]
+        }
+    }
+    return json.dumps({'type': 'ADDED', 'object': pod})
+
+
+def bench(name, lines, decode):
+    start = time.process_time()
+    for line in lines:
+        decode(line)
+    cost = time.process_time() - start
+    print('%-10s %10.0f events/s' % (name, len(lines) / cost))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    lines = [make_event(i) for i in range(count)]
+    model_watch = watch.Watch()
+    raw_watch = api.RawWatch()
+    bench('model', lines, lambda line: model_watch.unmarshal_event(line, client.V1Pod))
+    bench('raw', lines, lambda line: api.Pod.from_raw(raw_watch.unmarshal_event(line, None)['raw_object']))
+
+
+if __name__ == '__main__':
+    main()
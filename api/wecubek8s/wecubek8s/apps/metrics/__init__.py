@@ -0,0 +1,5 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+from wecubek8s.apps.metrics import route
@@ -0,0 +1,20 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+import logging
+
+from talos.core import config
+
+from wecubek8s.common import metrics
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+
+class Metrics(object):
+    name = 'k8s.metrics'
+
+    def on_get(self, req, resp, **kwargs):
+        resp.data = metrics.generate_latest()
+        resp.set_header('Content-Type', metrics.CONTENT_TYPE_LATEST)
@@ -0,0 +1,9 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+from wecubek8s.apps.metrics import controller
+
+
+def add_routes(api):
+    api.add_route('/kubernetes/metrics', controller.Metrics())
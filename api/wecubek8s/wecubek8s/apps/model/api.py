@@ -2,21 +2,54 @@
 
 from __future__ import absolute_import
 
-import logging
 import datetime
+import json
+import logging
+import types
 from urllib.parse import urlparse
 
-from kubernetes import watch
 from talos.common import cache
 from talos.core import config
+from talos.core import utils
 from talos.core.i18n import _
 from wecubek8s.common import jsonfilter
 from wecubek8s.common import k8s
 from wecubek8s.common import const
+from wecubek8s.common import metrics
+from wecubek8s.common import utils as plugin_utils
 from wecubek8s.db import resource as db_resource
 
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
+watch = plugin_utils.LazyModule('kubernetes.watch')
+k8s_exceptions = plugin_utils.LazyModule('kubernetes.client.exceptions')
+
+
+class RawWatch:
+    '''event['object'] is kept as raw json dict, deserializing into models costs too much cpu
+
+    wraps watch.Watch instead of subclassing it, so that kubernetes is not imported until watching
+    '''
+    def __init__(self):
+        self._watch = watch.Watch()
+        self._watch.get_return_type = self.get_return_type
+
+    def get_return_type(self, func):
+        return None
+
+    def __getattr__(self, attr):
+        return getattr(self._watch, attr)
+
+
+class WatchState:
+    '''state of watch which should survive reconnecting
+
+    resource_version: last seen resourceVersion, None means relist is required
+    items: uid -> latest object, used to find out missed events on relist
+    '''
+    def __init__(self):
+        self.resource_version = None
+        self.items = None
 
 
 class BaseEntity:
@@ -29,7 +62,8 @@ class BaseEntity:
             # but kubernetes plugin supports for more: gte/lte/notin/regex/set/notset
             # set test false/0/''/[]/{}/None as false
             # you can also use regex to match the value
-            results = [ret for ret in results if jsonfilter.match_all(filters, ret)]
+            with metrics.timer(metrics.JSONFILTER_DURATION, self.__class__.__name__):
+                results = [ret for ret in results if jsonfilter.match_all(filters, ret)]
         return results
 
     def clear_cache(self, clusters):
@@ -42,7 +76,8 @@ class BaseEntity:
                                         ]) + '.' + self.__class__.__name__
         cached_data = cache.get(cached_key, expires)
         if not cache.validate(cached_data):
-            cached_data = self.all(clusters)
+            with metrics.timer(metrics.ENTITY_LIST_DURATION, self.__class__.__name__):
+                cached_data = self.all(clusters)
             cache.set(cached_key, cached_data)
         return cached_data
 
@@ -50,9 +85,7 @@ class BaseEntity:
         return []
 
     def cluster_client(self, cluster):
-        k8s_auth = k8s.AuthToken(cluster['api_server'], cluster['token'])
-        k8s_client = k8s.Client(k8s_auth)
-        return k8s_client
+        return k8s.get_client(cluster['api_server'], cluster['token'], cluster['id'])
 
 
 class Cluster(BaseEntity):
@@ -205,6 +238,34 @@ class Service(BaseEntity):
 
 
 class Pod(BaseEntity):
+    @classmethod
+    def from_raw(cls, raw):
+        '''build lightweight object with only fields required by to_dict from raw json,
+        attributes are the same as V1Pod
+        '''
+        metadata = raw.get('metadata') or {}
+        spec = raw.get('spec') or {}
+        status = raw.get('status') or {}
+        creation_timestamp = metadata.get('creationTimestamp', None)
+        if creation_timestamp:
+            creation_timestamp = datetime.datetime.strptime(creation_timestamp,
+                                                            '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=datetime.timezone.utc)
+        owner_references = None
+        if metadata.get('ownerReferences', None):
+            owner_references = [
+                types.SimpleNamespace(controller=owner.get('controller', None),
+                                      kind=owner.get('kind', None),
+                                      uid=owner.get('uid', None)) for owner in metadata['ownerReferences']
+            ]
+        return types.SimpleNamespace(metadata=types.SimpleNamespace(uid=metadata.get('uid', None),
+                                                                    name=metadata.get('name', None),
+                                                                    namespace=metadata.get('namespace', None),
+                                                                    labels=metadata.get('labels', None),
+                                                                    owner_references=owner_references,
+                                                                    creation_timestamp=creation_timestamp),
+                                     spec=types.SimpleNamespace(node_name=spec.get('nodeName', None)),
+                                     status=types.SimpleNamespace(pod_ip=status.get('podIP', None)))
+
     @classmethod
     def to_dict(cls, cluster, item):
         correlation_id = None
@@ -253,17 +314,79 @@ class Pod(BaseEntity):
                 results.append(self.to_dict(cluster, item))
         return results
 
-    def watch(self, cluster, event_stop, notify):
+    def relist(self, cluster, k8s_client, notify, state, namespace=None, **selectors):
+        # skip deserializing into models, only fields required are extracted
+        if namespace:
+            resp = k8s_client.list_pod(namespace, _preload_content=False, **selectors)
+        else:
+            resp = k8s_client.list_all_pod(_preload_content=False, **selectors)
+        items = json.loads(resp.data)
+        latest_items = dict([(item.metadata.uid, item) for item in [self.from_raw(raw) for raw in items['items']]])
+        if state.items is not None:
+            # events missed while resourceVersion expired
+            for uid in set(latest_items.keys()) - set(state.items.keys()):
+                notify('POD.ADDED', cluster['id'], self.to_dict(cluster, latest_items[uid]))
+            for uid in set(state.items.keys()) - set(latest_items.keys()):
+                notify('POD.DELETED', cluster['id'], self.to_dict(cluster, state.items[uid]))
+        state.items = latest_items
+        state.resource_version = items['metadata']['resourceVersion']
+
+    def watch(self, cluster, event_stop, notify, state=None, namespace=None, label_selector=None,
+              field_selector=None, observe=None):
+        '''watch pod events from state.resource_version, state should be kept by caller between calls,
+        so that reconnecting resumes from the last seen event, pods are relisted only when it is expired(410)
+
+        namespace/label_selector/field_selector are applied by apiserver, events filtered out are never sent
+        observe(event_type, item) is called for every event received, for instrumentation
+        '''
+        state = state or WatchState()
         k8s_client = self.cluster_client(cluster)
-        current_time = datetime.datetime.now(datetime.timezone.utc)
-        w = watch.Watch()
-        for event in w.stream(k8s_client.core_client.list_pod_for_all_namespaces):
-            if event['type'] == 'ADDED':
-                # new -> alert
-                if event['object'].metadata.creation_timestamp >= current_time:
-                    notify('POD.ADDED', cluster['id'], self.to_dict(cluster, event['object']))
-            elif event['type'] == 'DELETED':
-                # delete -> alert
-                notify('POD.DELETED', cluster['id'], self.to_dict(cluster, event['object']))
-            if event_stop.is_set():
-                w.stop()
+        selectors = {}
+        if label_selector:
+            selectors['label_selector'] = label_selector
+        if field_selector:
+            selectors['field_selector'] = field_selector
+        if state.resource_version is None:
+            self.relist(cluster, k8s_client, notify, state, namespace=namespace, **selectors)
+        if namespace:
+            func, args = k8s_client.core_client.list_namespaced_pod, (namespace, )
+        else:
+            func, args = k8s_client.core_client.list_pod_for_all_namespaces, ()
+        watch_timeout = utils.get_config(CONF, 'k8s.watch_timeout', 300)
+        w = RawWatch()
+        try:
+            # read timeout detects dead connection which server never closes
+            for event in w.stream(func,
+                                  *args,
+                                  resource_version=state.resource_version,
+                                  allow_watch_bookmarks=True,
+                                  timeout_seconds=watch_timeout,
+                                  _request_timeout=(10, watch_timeout + 30),
+                                  **selectors):
+                if event['type'] == 'ERROR':
+                    if event['raw_object'].get('code', None) == 410:
+                        state.resource_version = None
+                        break
+                    raise k8s_exceptions.ApiException(status=event['raw_object'].get('code', None),
+                                                      reason=event['raw_object'].get('message', None))
+                # BOOKMARK only carries resourceVersion
+                item = None if event['type'] == 'BOOKMARK' else self.from_raw(event['raw_object'])
+                if observe:
+                    observe(event['type'], item)
+                if event['type'] == 'ADDED':
+                    # new -> alert
+                    state.items[item.metadata.uid] = item
+                    notify('POD.ADDED', cluster['id'], self.to_dict(cluster, item))
+                elif event['type'] == 'MODIFIED':
+                    state.items[item.metadata.uid] = item
+                elif event['type'] == 'DELETED':
+                    # delete -> alert
+                    state.items.pop(item.metadata.uid, None)
+                    notify('POD.DELETED', cluster['id'], self.to_dict(cluster, item))
+                state.resource_version = event['raw_object']['metadata']['resourceVersion']
+                if event_stop.is_set():
+                    w.stop()
+        except k8s_exceptions.ApiException as e:
+            if e.status != 410:
+                raise
+            state.resource_version = None
@@ -9,6 +9,7 @@ from talos.core.i18n import _
 from wecubek8s.common import k8s
 from wecubek8s.common import exceptions
 from wecubek8s.common import const
+from wecubek8s.common import rollout
 from wecubek8s.db import resource as db_resource
 from wecubek8s.apps.plugin import utils as api_utils
 
@@ -16,6 +17,15 @@ CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
 
+def get_cluster_client(name):
+    cluster_info = db_resource.Cluster().list({'name': name})
+    if not cluster_info:
+        raise exceptions.ValidationError(attribute='cluster',
+                                         msg=_('name of cluster(%(name)s) not found' % {'name': name}))
+    cluster_info = cluster_info[0]
+    return k8s.get_client(cluster_info['api_server'], cluster_info['token'], cluster_info['id'])
+
+
 class Cluster:
     def apply(self, data):
         cluster_info = db_resource.Cluster().list({'name': data['name']})
@@ -92,41 +102,48 @@ class Deployment:
 
     def apply(self, data):
         resource_id = data['correlation_id']
-        cluster_info = db_resource.Cluster().list({'name': data['cluster']})
-        if not cluster_info:
-            raise exceptions.ValidationError(attribute='cluster',
-                                             msg=_('name of cluster(%(name)s) not found' % {'name': data['cluster']}))
-        cluster_info = cluster_info[0]
-        k8s_auth = k8s.AuthToken(cluster_info['api_server'], cluster_info['token'])
-        k8s_client = k8s.Client(k8s_auth)
+        k8s_client = get_cluster_client(data['cluster'])
         k8s_client.ensure_namespace(data['namespace'])
         resource_name = api_utils.escape_name(data['name'])
         exists_resource = k8s_client.get_deployment(resource_name, data['namespace'])
+        template = self.to_resource(k8s_client, data)
+        template_hash = api_utils.set_spec_hash(template, const.Annotation.SPEC_HASH)
+        changed = True
         if exists_resource is None:
-            exists_resource = k8s_client.create_deployment(data['namespace'], self.to_resource(k8s_client, data))
+            exists_resource = k8s_client.create_deployment(data['namespace'], template)
+        elif api_utils.get_annotation(exists_resource, const.Annotation.SPEC_HASH) == template_hash:
+            # nothing changed since last apply, skip patch
+            changed = False
         else:
-            exists_resource = k8s_client.update_deployment(resource_name, data['namespace'],
-                                                           self.to_resource(k8s_client, data))
-        # TODO: k8s为异步接口，是否需要等待真正执行完毕
+            exists_resource = k8s_client.update_deployment(resource_name, data['namespace'], template)
+        if data.get('wait_timeout') and int(data['wait_timeout']) > 0:
+            status = rollout.wait_for_rollout(k8s_client, data['namespace'], resource_name, int(data['wait_timeout']))
+            if status == rollout.FAILED:
+                raise exceptions.RolloutFailedError(resource='deployment(%s)' % resource_name,
+                                                    reason='ProgressDeadlineExceeded')
+            if status != rollout.COMPLETE:
+                raise exceptions.WaitTimeoutError(resource='deployment(%s)' % resource_name,
+                                                  action='rolled out',
+                                                  timeout=data['wait_timeout'])
         return {
             'id': exists_resource.metadata.uid,
             'name': exists_resource.metadata.name,
-            'correlation_id': resource_id
+            'correlation_id': resource_id,
+            'changed': 'Y' if changed else 'N'
         }
 
     def remove(self, data):
-        cluster_info = db_resource.Cluster().list({'name': data['cluster']})
-        if not cluster_info:
-            raise exceptions.ValidationError(attribute='cluster',
-                                             msg=_('name of cluster(%(name)s) not found' % {'name': data['cluster']}))
-        cluster_info = cluster_info[0]
-        k8s_auth = k8s.AuthToken(cluster_info['api_server'], cluster_info['token'])
-        k8s_client = k8s.Client(k8s_auth)
+        k8s_client = get_cluster_client(data['cluster'])
         resource_name = api_utils.escape_name(data['name'])
         exists_resource = k8s_client.get_deployment(resource_name, data['namespace'])
         if exists_resource is not None:
             k8s_client.delete_deployment(resource_name, data['namespace'])
-        # TODO: k8s为异步接口，是否需要等待真正执行完毕
+            if data.get('wait_timeout') and int(data['wait_timeout']) > 0:
+                if not rollout.wait_for_deletion(k8s_client, data['namespace'], resource_name,
+                                                 int(data['wait_timeout'])):
+                    raise exceptions.WaitTimeoutError(resource='deployment(%s)' % resource_name,
+                                                      action='deleted',
+                                                      timeout=data['wait_timeout'])
         return {'id': '', 'name': '', 'correlation_id': ''}
 
 
@@ -166,36 +183,30 @@ class Service:
 
     def apply(self, data):
         resource_id = data['correlation_id']
-        cluster_info = db_resource.Cluster().list({'name': data['cluster']})
-        if not cluster_info:
-            raise exceptions.ValidationError(attribute='cluster',
-                                             msg=_('name of cluster(%(name)s) not found' % {'name': data['cluster']}))
-        cluster_info = cluster_info[0]
-        k8s_auth = k8s.AuthToken(cluster_info['api_server'], cluster_info['token'])
-        k8s_client = k8s.Client(k8s_auth)
+        k8s_client = get_cluster_client(data['cluster'])
         k8s_client.ensure_namespace(data['namespace'])
         resource_name = api_utils.escape_name(data['name'])
         exists_resource = k8s_client.get_service(resource_name, data['namespace'])
+        template = self.to_resource(k8s_client, data)
+        template_hash = api_utils.set_spec_hash(template, const.Annotation.SPEC_HASH)
+        changed = True
         if not exists_resource:
-            exists_resource = k8s_client.create_service(data['namespace'], self.to_resource(k8s_client, data))
+            exists_resource = k8s_client.create_service(data['namespace'], template)
+        elif api_utils.get_annotation(exists_resource, const.Annotation.SPEC_HASH) == template_hash:
+            # nothing changed since last apply, skip patch
+            changed = False
         else:
-            exists_resource = k8s_client.update_service(resource_name, data['namespace'],
-                                                        self.to_resource(k8s_client, data))
+            exists_resource = k8s_client.update_service(resource_name, data['namespace'], template)
         # TODO: k8s为异步接口，是否需要等待真正执行完毕
         return {
             'id': exists_resource.metadata.uid,
             'name': exists_resource.metadata.name,
-            'correlation_id': resource_id
+            'correlation_id': resource_id,
+            'changed': 'Y' if changed else 'N'
         }
 
     def remove(self, data):
-        cluster_info = db_resource.Cluster().list({'name': data['cluster']})
-        if not cluster_info:
-            raise exceptions.ValidationError(attribute='cluster',
-                                             msg=_('name of cluster(%(name)s) not found' % {'name': data['cluster']}))
-        cluster_info = cluster_info[0]
-        k8s_auth = k8s.AuthToken(cluster_info['api_server'], cluster_info['token'])
-        k8s_client = k8s.Client(k8s_auth)
+        k8s_client = get_cluster_client(data['cluster'])
         resource_name = api_utils.escape_name(data['name'])
         exists_resource = k8s_client.get_service(resource_name, data['namespace'])
         if exists_resource is not None:
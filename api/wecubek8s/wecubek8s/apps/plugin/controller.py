@@ -2,11 +2,14 @@
 
 from __future__ import absolute_import
 
+import json
+
 from talos.db import crud
 from talos.core.i18n import _
 
 from wecubek8s.common import controller
 from wecubek8s.common import exceptions
+from wecubek8s.db import resource as db_resource
 from wecubek8s.apps.plugin import rules
 from wecubek8s.apps.plugin import api as plugin_api
 
@@ -41,6 +44,9 @@ class Deployment(controller.Plugin):
     allow_methods = ('POST', )
     name = 'k8s.plugin.deployment'
 
+    def group_item(self, item):
+        return item.get('cluster', None)
+
     def set_item_default(self, item):
         defaults = {'namespace': 'default', 'replicas': '1', 'affinity': 'anti-host-preferred'}
         for key, value in defaults.items():
@@ -53,7 +59,7 @@ class Deployment(controller.Plugin):
         return clean_item
 
     def validate_item_destroy(self, item_index, item):
-        clean_item = crud.ColumnValidator.get_clean_data(rules.destroy_rules, item, 'check')
+        clean_item = crud.ColumnValidator.get_clean_data(rules.deployment_destroy_rules, item, 'check')
         if not clean_item.get('namespace'):
             clean_item['namespace'] = 'default'
         return clean_item
@@ -69,6 +75,9 @@ class Service(controller.Plugin):
     allow_methods = ('POST', )
     name = 'k8s.plugin.service'
 
+    def group_item(self, item):
+        return item.get('cluster', None)
+
     def set_item_default(self, item):
         defaults = {'namespace': 'default', 'type': 'ClusterIP', 'sessionAffinity': None}
         for key, value in defaults.items():
@@ -100,4 +109,18 @@ class Service(controller.Plugin):
         return plugin_api.Service().apply(item)
 
     def destroy(self, reqid, operator, item_index, item, **kwargs):
-        return plugin_api.Service().remove(item)
\ No newline at end of file
+        return plugin_api.Service().remove(item)
+
+
+class Job(controller.Item):
+    allow_methods = ('GET', )
+    name = 'k8s.plugin.job'
+    resource = db_resource.PluginJob
+
+    def get(self, req, **kwargs):
+        ref = super().get(req, **kwargs)
+        if ref:
+            # request is not exposed, it may contain token/password
+            ref.pop('request', None)
+            ref['result'] = json.loads(ref['result']) if ref['result'] else None
+        return ref
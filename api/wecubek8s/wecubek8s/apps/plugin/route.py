@@ -13,3 +13,10 @@ def add_routes(api):
     api.add_route('/kubernetes/v1/deployments/destroy', controller.Deployment(action='destroy'))
     api.add_route('/kubernetes/v1/services/apply', controller.Service(action='apply'))
     api.add_route('/kubernetes/v1/services/destroy', controller.Service(action='destroy'))
+
+    api.add_route('/kubernetes/v1/deployments/async-apply', controller.Deployment(action='apply', asynchronous=True))
+    api.add_route('/kubernetes/v1/deployments/async-destroy', controller.Deployment(action='destroy',
+                                                                                    asynchronous=True))
+    api.add_route('/kubernetes/v1/services/async-apply', controller.Service(action='apply', asynchronous=True))
+    api.add_route('/kubernetes/v1/services/async-destroy', controller.Service(action='destroy', asynchronous=True))
+    api.add_route('/kubernetes/v1/jobs/{rid}', controller.Job())
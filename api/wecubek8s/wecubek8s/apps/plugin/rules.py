@@ -157,6 +157,11 @@ deployment_rules = [
                          validate_on=['check:O'],
                          converter=validator.StringToList(),
                          nullable=True),
+    # seconds to wait for rollout, empty/0 means no wait
+    crud.ColumnValidator(field='wait_timeout',
+                         rule=validator.RegexValidator(r'^\d*$'),
+                         validate_on=['check:O'],
+                         nullable=True),
 ]
 
 service_rules = [
@@ -237,4 +242,12 @@ destroy_rules = [
                          rule=validator.LengthValidator(0, 255),
                          validate_on=['check:O'],
                          nullable=True),
-]
\ No newline at end of file
+]
+
+deployment_destroy_rules = destroy_rules + [
+    # seconds to wait for deletion, empty/0 means no wait
+    crud.ColumnValidator(field='wait_timeout',
+                         rule=validator.RegexValidator(r'^\d*$'),
+                         validate_on=['check:O'],
+                         nullable=True),
+]
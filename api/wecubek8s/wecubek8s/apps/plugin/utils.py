@@ -2,6 +2,8 @@
 
 from __future__ import absolute_import
 
+import hashlib
+import json
 import logging
 import re
 
@@ -23,6 +25,26 @@ def escape_name(name):
     return re.sub(rule, '-', name.lower())
 
 
+def spec_hash(template):
+    '''stable hash of rendered resource template, key order independent
+    '''
+    return hashlib.sha1(json.dumps(template, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def set_spec_hash(template, annotation_key):
+    '''annotate template with hash of itself, returns the hash
+    '''
+    value = spec_hash(template)
+    template['metadata'].setdefault('annotations', {})[annotation_key] = value
+    return value
+
+
+def get_annotation(resource, annotation_key):
+    if resource is None or not resource.metadata.annotations:
+        return None
+    return resource.metadata.annotations.get(annotation_key, None)
+
+
 def convert_tag(items):
     labels = {}
     for tag in items:
@@ -224,6 +246,9 @@ def convert_registry_secret(k8s_client, images, namespace, username, password):
             name = ''
             name = registry_server + '#' + username
             name = escape_name(name)
+            # images from the same registry share one secret
+            if {'name': name} in rets:
+                continue
             k8s_client.ensure_registry_secret(name, namespace, registry_server, username, password)
             rets.append({'name': name})
     return rets
@@ -10,4 +10,8 @@ class Tag:
     POD_AFFINITY_TAG = 'wecube-pod-affinity-tag'
     DEPLOYMENT_ID_TAG = 'wecube-deployment-correlation-id'
     SERVICE_ID_TAG = 'wecube-service-correlation-id'
-    POD_ID_TAG = 'wecube-pod-correlation-id'
\ No newline at end of file
+    POD_ID_TAG = 'wecube-pod-correlation-id'
+
+
+class Annotation:
+    SPEC_HASH = 'wecube-spec-hash'
@@ -2,12 +2,16 @@
 
 from __future__ import absolute_import
 
+import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor as PoolExecutor
 
 import falcon
 from talos.common.controller import CollectionController
 from talos.common.controller import ItemController
 from talos.common.controller import Controller as BaseController
+from talos.core import config
 from talos.core import exceptions as base_ex
 from talos.core import utils
 from talos.core.i18n import _
@@ -15,8 +19,22 @@ from talos.db import crud
 from talos.db import validator
 
 from wecubek8s.common import exceptions
+from wecubek8s.common import utils as k8s_utils
+from wecubek8s.common import wecube
+from wecubek8s.db import resource as db_resource
 
 LOG = logging.getLogger(__name__)
+CONF = config.CONF
+_ASYNC_POOL = None
+_ASYNC_POOL_LOCK = threading.Lock()
+
+
+def get_async_pool():
+    global _ASYNC_POOL
+    with _ASYNC_POOL_LOCK:
+        if _ASYNC_POOL is None:
+            _ASYNC_POOL = PoolExecutor(utils.get_config(CONF, 'plugin.async_workers', 4))
+    return _ASYNC_POOL
 
 
 class Controller(BaseController):
@@ -160,62 +178,152 @@ class Plugin(BaseController):
                              nullable=False),
     ]
 
-    def __init__(self, action=None) -> None:
+    def __init__(self, action=None, asynchronous=False) -> None:
         super().__init__()
         self._default_action = action or 'process'
+        self._asynchronous = asynchronous
 
     def on_post(self, req, resp, **kwargs):
         self._validate_method(req)
         self._validate_data(req)
-        resp.json = self.process_post(req, req.json, **kwargs)
+        if self._asynchronous:
+            resp.json = self.process_post_async(req, req.json, **kwargs)
+        else:
+            resp.json = self.process_post(req, req.json, **kwargs)
         resp.status = falcon.HTTP_200
 
     def validate_item(self, item_index, item):
         # do return crud.ColumnValidator.get_clean_data(rules, item, 'check')
         return item
 
+    def group_item(self, item):
+        # items in the same group(eg. same cluster) share the concurrency cap, None means default group
+        return None
+
     def process(self, reqid, operator, item_index, item, **kwargs):
         raise NotImplementedError()
 
+    def process_item(self, reqid, operator, item_index, item, **kwargs):
+        single_result = {
+            'callbackParameter': item.get('callbackParameter', None),
+            'errorCode': '0',
+            'errorMessage': 'success'
+        }
+        try:
+            validate_item_func = getattr(self, 'validate_item_' + self._default_action, self.validate_item)
+            clean_item = validate_item_func(item_index, item)
+            process_func = getattr(self, self._default_action, self.process)
+            process_result = process_func(reqid, operator, item_index, clean_item, **kwargs)
+            if process_result:
+                single_result.update(process_result)
+        except Exception as e:
+            LOG.exception(e)
+            single_result['errorCode'] = '1'
+            single_result['errorMessage'] = str(e)
+        return single_result
+
+    def process_items(self, reqid, operator, items, **kwargs):
+        concurrency = utils.get_config(CONF, 'plugin.concurrency', 10)
+        group_concurrency = utils.get_config(CONF, 'plugin.concurrency_per_cluster', 4)
+        if concurrency <= 1 or len(items) <= 1:
+            return [self.process_item(reqid, operator, idx, item, **kwargs) for idx, item in enumerate(items)]
+        groups = {}
+        for idx, item in enumerate(items):
+            groups.setdefault(self.group_item(item), []).append(idx)
+        semaphores = dict([(key, threading.BoundedSemaphore(group_concurrency)) for key in groups])
+        # worker threads do not share request scoped globals
+        scoped_vars = k8s_utils.capture_scoped_globals()
+
+        def _worker(semaphore, idx, item):
+            k8s_utils.restore_scoped_globals(scoped_vars)
+            with semaphore:
+                return self.process_item(reqid, operator, idx, item, **kwargs)
+
+        # submit items round-robin between groups, so a busy cluster won't block the others
+        indexes = []
+        group_indexes = list(groups.values())
+        while group_indexes:
+            indexes.extend([idxs.pop(0) for idxs in group_indexes])
+            group_indexes = [idxs for idxs in group_indexes if idxs]
+        futures = {}
+        with PoolExecutor(min(concurrency, len(items))) as pool:
+            for idx in indexes:
+                futures[idx] = pool.submit(_worker, semaphores[self.group_item(items[idx])], idx, items[idx])
+        # keep outputs in input order
+        return [futures[idx].result() for idx in range(len(items))]
+
     def process_post(self, req, data, **kwargs):
         result = {'resultCode': '0', 'resultMessage': 'success', 'results': {'outputs': []}}
-        is_item_error = False
         error_indexes = []
         try:
             clean_data = crud.ColumnValidator.get_clean_data(self._param_rules, data, 'check')
             reqid = clean_data.get('requestId', None) or 'N/A'
             operator = clean_data.get('operator', None) or 'N/A'
-            for idx, item in enumerate(clean_data['inputs']):
-                single_result = {
-                    'callbackParameter': item.get('callbackParameter', None),
-                    'errorCode': '0',
-                    'errorMessage': 'success'
-                }
-                try:
-                    validate_item_func = getattr(self, 'validate_item_' + self._default_action, self.validate_item)
-                    clean_item = validate_item_func(idx, item)
-                    process_func = getattr(self, self._default_action, self.process)
-                    process_result = process_func(reqid, operator, idx, clean_item, **kwargs)
-                    if process_result:
-                        single_result.update(process_result)
-                    result['results']['outputs'].append(single_result)
-                except Exception as e:
-                    LOG.exception(e)
-                    single_result['errorCode'] = '1'
-                    single_result['errorMessage'] = str(e)
-                    result['results']['outputs'].append(single_result)
-                    is_item_error = True
+            result['results']['outputs'] = self.process_items(reqid, operator, clean_data['inputs'], **kwargs)
+            for idx, single_result in enumerate(result['results']['outputs']):
+                if single_result['errorCode'] != '0':
                     error_indexes.append(str(idx + 1))
         except Exception as e:
             LOG.exception(e)
             result['resultCode'] = '1'
             result['resultMessage'] = str(e)
-        if is_item_error:
+        if error_indexes:
             result['resultCode'] = '1'
             result['resultMessage'] = _('Fail to process [%(num)s] record, detail error in the data block') % dict(
                 num=','.join(error_indexes))
         return result
 
+    def process_post_async(self, req, data, **kwargs):
+        result = {'resultCode': '0', 'resultMessage': 'success', 'results': {'outputs': []}}
+        try:
+            clean_data = crud.ColumnValidator.get_clean_data(self._param_rules, data, 'check')
+            job = db_resource.PluginJob().create({
+                'request_id': clean_data.get('requestId', None),
+                'name': '%s.%s' % (self.name, self._default_action),
+                'status': 'pending',
+                'request': json.dumps(data)
+            })
+            result['results']['jobId'] = job['id']
+            get_async_pool().submit(self.run_job, job['id'], k8s_utils.capture_scoped_globals(), data, **kwargs)
+        except Exception as e:
+            LOG.exception(e)
+            result['resultCode'] = '1'
+            result['resultMessage'] = str(e)
+        return result
+
+    def run_job(self, job_id, scoped_vars, data, **kwargs):
+        k8s_utils.restore_scoped_globals(scoped_vars)
+        try:
+            if not db_resource.PluginJob().transit(job_id, ['pending'], {'status': 'running'}):
+                # failed by scheduler(timeout) already
+                LOG.warning('plugin job: %s is not pending, skip running', job_id)
+                return
+            result = self.process_post(scoped_vars['request'], data, **kwargs)
+            result['results']['requestId'] = data.get('requestId', None)
+        except Exception as e:
+            LOG.error('exception raised while running plugin job: %s', job_id)
+            LOG.exception(e)
+            result = wecube.plugin_failed_result(data.get('requestId', None), data.get('inputs', None), str(e))
+        status = 'success' if result['resultCode'] == '0' else 'failed'
+        try:
+            # job is still pending if it failed to be marked as running
+            if not db_resource.PluginJob().transit(job_id, ['pending', 'running'], {
+                    'status': status,
+                    'result': json.dumps(result)
+            }):
+                LOG.warning('plugin job: %s is finished already, skip callback', job_id)
+                return
+        except Exception as e:
+            # platform is waiting for callback, send it even if job status is not saved
+            LOG.error('exception raised while saving plugin job: %s', job_id)
+            LOG.exception(e)
+        try:
+            client = wecube.WeCubeClient(CONF.wecube.base_url, None)
+            client.plugin_callback(result)
+        except Exception as e:
+            LOG.error('exception raised while callback plugin job: %s', job_id)
+            LOG.exception(e)
+
 
 class ModelPostQuery(BaseController):
     allow_methods = ('POST', )
@@ -107,10 +107,43 @@ class K8sCallError(PluginError):
     code = 200
     error_code = 40000
 
+    def __init__(self, message=None, exception_data=None, status=None, **kwargs):
+        # http status returned by kubernetes apiserver, None if not available
+        self.status = status
+        super(K8sCallError, self).__init__(message, exception_data=exception_data, **kwargs)
+
     @property
     def title(self):
         return _('K8s Processing Error')
 
     @property
     def message_format(self):
-        return _('Cluster(%(cluster)s) process error, detail: %(msg)s')
\ No newline at end of file
+        return _('Cluster(%(cluster)s) process error, detail: %(msg)s')
+
+
+class WaitTimeoutError(PluginError):
+    """等待K8s异步操作超时异常"""
+    code = 200
+    error_code = 40008
+
+    @property
+    def title(self):
+        return _('Wait Timeout')
+
+    @property
+    def message_format(self):
+        return _('%(resource)s is not %(action)s in %(timeout)s seconds')
+
+
+class RolloutFailedError(PluginError):
+    """Deployment发布失败异常"""
+    code = 200
+    error_code = 40010
+
+    @property
+    def title(self):
+        return _('Rollout Failed')
+
+    @property
+    def message_format(self):
+        return _('%(resource)s rollout failed, reason: %(reason)s')
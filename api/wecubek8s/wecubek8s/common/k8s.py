@@ -5,17 +5,63 @@ from __future__ import absolute_import
 import logging
 import json
 import base64
+import hashlib
+import threading
+import time
 import urllib3
 
-from kubernetes import client
-from kubernetes.client import exceptions as k8s_exceptions
 from talos.core import config
+from talos.core import utils
 from talos.core.i18n import _
 from wecubek8s.common import exceptions
+from wecubek8s.common import metrics
+from wecubek8s.common import ratelimit
+from wecubek8s.common import utils as plugin_utils
 
 urllib3.disable_warnings()
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
+# importing kubernetes costs hundreds of model modules, only when k8s api is really called
+client = plugin_utils.LazyModule('kubernetes.client')
+k8s_exceptions = plugin_utils.LazyModule('kubernetes.client.exceptions')
+
+
+class EnsuredCache:
+    """per-cluster memo of namespaces & registry secrets which have been ensured
+
+    key: (api_server, kind, namespace, name), value: (content hash, expire time)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def hit(self, api_server, kind, namespace, name, content=None):
+        key = (api_server, kind, namespace, name)
+        with self._lock:
+            item = self._items.get(key, None)
+            if item is None:
+                return False
+            if item[1] < time.time():
+                del self._items[key]
+                return False
+            return item[0] == content
+
+    def add(self, api_server, kind, namespace, name, content=None, ttl=300):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._items[(api_server, kind, namespace, name)] = (content, time.time() + ttl)
+
+    def invalidate(self, api_server, namespace=None):
+        with self._lock:
+            for key in list(self._items.keys()):
+                if key[0] == api_server and (namespace is None or key[2] == namespace):
+                    del self._items[key]
+
+
+ENSURED = EnsuredCache()
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
 
 
 class AuthToken:
@@ -40,31 +86,67 @@ class AuthUserPass:
 
 
 class Client:
-    def __init__(self, auth) -> None:
+    def __init__(self, auth, cluster_id) -> None:
         configuration = client.Configuration()
         auth(configuration)
         self.auth = auth
+        # metric label & rate limit key, api_server is not exposed by metrics
+        self.cluster_id = cluster_id
+        # seconds to remember ensured namespace/secret, 0 to disable
+        self.ensure_cache_ttl = utils.get_config(CONF, 'k8s.ensure_cache_ttl', 300)
         api_client = client.ApiClient(configuration)
         self.core_client = client.CoreV1Api(api_client)
         self.app_client = client.AppsV1Api(api_client)
 
-    def _action(self, client, func_name, *args, **kwargs):
+    def _call(self, client, func_name, *args, **kwargs):
         func = getattr(client, func_name)
+        cluster = self.cluster_id
+        kind = ratelimit.READ if func_name.startswith(('read_', 'list_')) else ratelimit.WRITE
+        if not ratelimit.acquire(cluster, kind):
+            raise exceptions.K8sCallError(cluster=cluster,
+                                          msg=_('too many %(kind)s requests, client rate limit exceeded') %
+                                          {'kind': kind},
+                                          status=429)
+        with metrics.timer(metrics.K8S_REQUEST_DURATION, cluster, func_name):
+            try:
+                result = func(*args, **kwargs)
+            except k8s_exceptions.ApiException as e:
+                # not found is expected for detail query
+                if not (e.status == 404 and func_name.startswith('read_')):
+                    metrics.K8S_REQUEST_ERRORS.labels(cluster, func_name, str(e.status)).inc()
+                raise
+            except Exception:
+                metrics.K8S_REQUEST_ERRORS.labels(cluster, func_name, 'error').inc()
+                raise
+        metrics.observe_k8s_response(cluster, func_name, result)
+        return result
+
+    def _action(self, client, func_name, *args, **kwargs):
         try:
-            result = func(*args, **kwargs)
-            return result
+            return self._call(client, func_name, *args, **kwargs)
         except k8s_exceptions.ApiException as e:
-            raise exceptions.K8sCallError(cluster=self.auth.api_server, msg=json.loads(e.body)['message'])
+            raise exceptions.K8sCallError(cluster=self.auth.api_server,
+                                          msg=json.loads(e.body)['message'],
+                                          status=e.status)
+
+    def _namespaced_action(self, namespace, client, func_name, *args, **kwargs):
+        try:
+            return self._action(client, func_name, *args, **kwargs)
+        except exceptions.K8sCallError as e:
+            # namespace/secret may be deleted or changed outside, forget what we have ensured
+            if e.status in (404, 409):
+                ENSURED.invalidate(self.auth.api_server, namespace)
+            raise
 
     def _action_detail(self, client, func_name, *args, **kwargs):
-        func = getattr(client, func_name)
         try:
-            result = func(*args, **kwargs)
-            return result
+            return self._call(client, func_name, *args, **kwargs)
         except k8s_exceptions.ApiException as e:
             if e.status == 404:
                 return None
-            raise exceptions.K8sCallError(cluster=self.auth.api_server, msg=json.loads(e.body)['message'])
+            raise exceptions.K8sCallError(cluster=self.auth.api_server,
+                                          msg=json.loads(e.body)['message'],
+                                          status=e.status)
 
     # Node
     def list_node(self, **kwargs):
@@ -78,6 +160,7 @@ class Client:
         return self._action(self.core_client, 'patch_namespace', name, body, **kwargs)
 
     def delete_namespace(self, name, **kwargs):
+        ENSURED.invalidate(self.auth.api_server, name)
         return self._action(self.core_client, 'delete_namespace', name, **kwargs)
 
     def get_namespace(self, name, **kwargs):
@@ -88,10 +171,12 @@ class Client:
 
     # Deployment
     def create_deployment(self, namespace, body, **kwargs):
-        return self._action(self.app_client, 'create_namespaced_deployment', namespace, body, **kwargs)
+        return self._namespaced_action(namespace, self.app_client, 'create_namespaced_deployment', namespace, body,
+                                       **kwargs)
 
     def update_deployment(self, name, namespace, body, **kwargs):
-        return self._action(self.app_client, 'patch_namespaced_deployment', name, namespace, body, **kwargs)
+        return self._namespaced_action(namespace, self.app_client, 'patch_namespaced_deployment', name, namespace, body,
+                                       **kwargs)
 
     def delete_deployment(self, name, namespace, **kwargs):
         return self._action(self.app_client, 'delete_namespaced_deployment', name, namespace, **kwargs)
@@ -110,15 +195,20 @@ class Client:
         return self._action(self.app_client, 'list_replica_set_for_all_namespaces', **kwargs)
 
     # Pod
+    def list_pod(self, namespace, **kwargs):
+        return self._action(self.core_client, 'list_namespaced_pod', namespace, **kwargs)
+
     def list_all_pod(self, **kwargs):
         return self._action(self.core_client, 'list_pod_for_all_namespaces', **kwargs)
 
     # Service
     def create_service(self, namespace, body, **kwargs):
-        return self._action(self.core_client, 'create_namespaced_service', namespace, body, **kwargs)
+        return self._namespaced_action(namespace, self.core_client, 'create_namespaced_service', namespace, body,
+                                       **kwargs)
 
     def update_service(self, name, namespace, body, **kwargs):
-        return self._action(self.core_client, 'patch_namespaced_service', name, namespace, body, **kwargs)
+        return self._namespaced_action(namespace, self.core_client, 'patch_namespaced_service', name, namespace, body,
+                                       **kwargs)
 
     def delete_service(self, name, namespace, **kwargs):
         return self._action(self.core_client, 'delete_namespaced_service', name, namespace, **kwargs)
@@ -134,12 +224,15 @@ class Client:
 
     # Secret
     def create_secret(self, namespace, body, **kwargs):
-        return self._action(self.core_client, 'create_namespaced_secret', namespace, body, **kwargs)
+        return self._namespaced_action(namespace, self.core_client, 'create_namespaced_secret', namespace, body,
+                                       **kwargs)
 
     def update_secret(self, name, namespace, body, **kwargs):
-        return self._action(self.core_client, 'patch_namespaced_secret', name, namespace, body, **kwargs)
+        return self._namespaced_action(namespace, self.core_client, 'patch_namespaced_secret', name, namespace, body,
+                                       **kwargs)
 
     def delete_secret(self, name, namespace, **kwargs):
+        ENSURED.invalidate(self.auth.api_server, namespace)
         return self._action(self.core_client, 'delete_namespaced_secret', name, namespace, **kwargs)
 
     def get_secret(self, name, namespace, **kwargs):
@@ -173,18 +266,45 @@ class Client:
                 '.dockerconfigjson': base64.b64encode((json.dumps(auth_data).encode('utf-8'))).decode()
             }
         }
+        content_hash = hashlib.sha1(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()
+        if ENSURED.hit(self.auth.api_server, 'secret', namespace, name, content_hash):
+            return True
         has_secret = self.get_secret(name, namespace)
         if has_secret is None:
             self.create_secret(namespace, body, **kwargs)
         else:
             self.update_secret(name, namespace, body)
+        ENSURED.add(self.auth.api_server, 'secret', namespace, name, content_hash, ttl=self.ensure_cache_ttl)
         return True
 
     def ensure_namespace(self, name, **kwargs):
+        if ENSURED.hit(self.auth.api_server, 'namespace', name, name):
+            return True
         body = {'apiVersion': 'v1', 'kind': 'Namespace', 'metadata': {'name': name}, 'labels': {}}
         has_namespace = self.get_namespace(name)
         if has_namespace is None:
-            self.create_namespace(body, **kwargs)
+            try:
+                self.create_namespace(body, **kwargs)
+            except exceptions.K8sCallError as e:
+                # created by others at the same time
+                if e.status != 409:
+                    raise
         else:
             self.update_namespace(name, body)
-        return True
\ No newline at end of file
+        ENSURED.add(self.auth.api_server, 'namespace', name, name, ttl=self.ensure_cache_ttl)
+        return True
+
+
+def get_client(api_server, token, cluster_id):
+    '''get shared client of cluster, connection pool of client is reused by all callers
+    '''
+    key = (api_server, token)
+    with _CLIENTS_LOCK:
+        k8s_client = _CLIENTS.get(key, None)
+        if k8s_client is None:
+            # token of cluster changed, drop the stale one
+            for stale_key in [k for k in _CLIENTS if k[0] == api_server]:
+                del _CLIENTS[stale_key]
+            k8s_client = Client(AuthToken(api_server, token), cluster_id)
+            _CLIENTS[key] = k8s_client
+    return k8s_client
@@ -0,0 +1,198 @@
+# coding=utf-8
+"""
+wecubek8s.common.loghandler
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+本模块提供异步日志Handler，日志记录进入内存缓冲区，由后台线程批量格式化并写入文件
+
+缓冲区满时优先丢弃DEBUG日志，其次丢弃INFO日志，WARNING及以上级别日志不丢弃；
+文件被改名(如scheduler的rotate_log)后自动重新打开，与WatchedFileHandler行为一致；
+fork或gevent monkey patch(如gunicorn gevent worker)之后重新创建锁与后台线程
+
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import collections
+import copy
+import itertools
+import logging
+import os
+import sys
+import threading
+from logging.handlers import WatchedFileHandler
+
+_DEFAULT_FORMATTER = logging.Formatter()
+
+
+def _green_threading():
+    monkey = sys.modules.get('gevent.monkey')
+    return bool(monkey and monkey.is_module_patched('threading'))
+
+
+class AsyncFileHandler(logging.Handler):
+    """logging handler writes records in background thread
+
+    usage in config: {"handler": "wecubek8s.common.loghandler:AsyncFileHandler", "handler_args": [path]}
+    """
+    def __init__(self, path, queue_size=10000, batch_size=200, flush_interval=0.5):
+        super(AsyncFileHandler, self).__init__()
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._file_handler = WatchedFileHandler(path, delay=True)
+        self._init_buffer()
+        if hasattr(os, 'register_at_fork'):
+            # lock may be held by writer thread of parent while forking
+            os.register_at_fork(after_in_child=self._init_buffer)
+        atexit.register(self.flush)
+
+    def _init_buffer(self):
+        # called again in forked child, thread & lock are not inherited
+        self._pid = os.getpid()
+        self._green = _green_threading()
+        self._cond = threading.Condition(threading.Lock())
+        self._file_handler.createLock()
+        # (sequence, record), DEBUG records are kept separately to be dropped first in O(1)
+        self._seq = itertools.count()
+        self._debug_buffer = collections.deque()
+        self._buffer = collections.deque()
+        self._dropped = 0
+        self._thread = None
+
+    def _reset(self):
+        '''threading is patched by gevent after lock & writer thread are created,
+        lock of os thread blocks the whole hub if it is held by a greenlet, so they are recreated and buffered records
+        are taken over by the new writer, old writer exits when it finds its condition is replaced
+        '''
+        cond, file_lock = self._cond, self._file_handler.lock
+        with cond, file_lock:
+            buffers = (self._seq, self._debug_buffer, self._buffer, self._dropped)
+            self._init_buffer()
+            self._seq, self._debug_buffer, self._buffer, self._dropped = buffers
+
+    def _start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(self._cond, ), name='async-log-writer', daemon=True)
+        # never start thread with lock held, greenlet of patched thread runs(and waits the lock) before start returns
+        self._thread.start()
+
+    def setFormatter(self, fmt):
+        super(AsyncFileHandler, self).setFormatter(fmt)
+        self._file_handler.setFormatter(fmt)
+
+    def _size(self):
+        return len(self._debug_buffer) + len(self._buffer)
+
+    def prepare(self, record):
+        '''same as QueueHandler.prepare, message is rendered now, args may be changed after logging
+        '''
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = (self.formatter or _DEFAULT_FORMATTER).formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        # fallback of register_at_fork, never touch lock inherited from parent
+        if self._pid != os.getpid():
+            self._init_buffer()
+        elif self._green != _green_threading():
+            self._reset()
+        if self._thread is None:
+            self._start()
+        try:
+            record = self.prepare(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._cond:
+            if self._size() >= self.queue_size:
+                if record.levelno <= logging.DEBUG:
+                    self._dropped += 1
+                    return
+                if self._debug_buffer:
+                    self._debug_buffer.popleft()
+                    self._dropped += 1
+                elif record.levelno < logging.WARNING:
+                    self._dropped += 1
+                    return
+            if record.levelno <= logging.DEBUG:
+                self._debug_buffer.append((next(self._seq), record))
+            else:
+                self._buffer.append((next(self._seq), record))
+            if self._size() >= self.batch_size:
+                self._cond.notify()
+
+    def _take(self):
+        with self._cond:
+            return self._take_locked()
+
+    def _take_locked(self):
+        records = []
+        # merge two buffers in logging order
+        while (self._debug_buffer or self._buffer) and len(records) < self.batch_size:
+            if not self._buffer or (self._debug_buffer and self._debug_buffer[0][0] < self._buffer[0][0]):
+                records.append(self._debug_buffer.popleft()[1])
+            else:
+                records.append(self._buffer.popleft()[1])
+        dropped, self._dropped = self._dropped, 0
+        return records, dropped
+
+    def _write(self, records, dropped):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if dropped:
+            lines.append('%d log records dropped, log buffer is full' % dropped)
+        if not lines:
+            return
+        handler = self._file_handler
+        handler.acquire()
+        try:
+            # reopen if file is renamed by rotate_log
+            handler.reopenIfNeeded()
+            if handler.stream is None:
+                handler.stream = handler._open()
+            handler.stream.write(handler.terminator.join(lines) + handler.terminator)
+            handler.stream.flush()
+        except Exception:
+            self.handleError(records[-1] if records else None)
+        finally:
+            handler.release()
+
+    def flush(self):
+        if self._pid != os.getpid():
+            return
+        while True:
+            records, dropped = self._take()
+            if not records and not dropped:
+                break
+            self._write(records, dropped)
+
+    def close(self):
+        self.flush()
+        self._file_handler.close()
+        super(AsyncFileHandler, self).close()
+
+    def _run(self, cond):
+        while True:
+            with cond:
+                if self._size() < self.batch_size:
+                    cond.wait(self.flush_interval)
+                if cond is not self._cond:
+                    # replaced by _reset
+                    return
+                records, dropped = self._take_locked()
+            try:
+                self._write(records, dropped)
+            except Exception:
+                pass
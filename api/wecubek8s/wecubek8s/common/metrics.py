@@ -0,0 +1,94 @@
+# coding=utf-8
+"""
+wecubek8s.common.metrics
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+本模块提供Prometheus指标统计能力
+
+多进程(gunicorn worker/watcher/scheduler)部署时，设置环境变量PROMETHEUS_MULTIPROC_DIR为共享目录，
+各进程指标写入该目录，由任意worker汇总输出
+
+"""
+
+from __future__ import absolute_import
+
+import contextlib
+import os
+import time
+
+import prometheus_client
+from prometheus_client import multiprocess
+
+CONTENT_TYPE_LATEST = prometheus_client.CONTENT_TYPE_LATEST
+
+K8S_REQUEST_DURATION = prometheus_client.Histogram('wecubek8s_k8s_request_duration_seconds',
+                                                   'Latency of kubernetes api calls', ['cluster', 'action'])
+K8S_REQUEST_ERRORS = prometheus_client.Counter('wecubek8s_k8s_request_errors_total',
+                                               'Failed kubernetes api calls', ['cluster', 'action', 'status'])
+K8S_RESPONSE_ITEMS = prometheus_client.Histogram('wecubek8s_k8s_response_items',
+                                                 'Number of items returned by kubernetes list calls',
+                                                 ['cluster', 'action'],
+                                                 buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000,
+                                                          float('inf')))
+K8S_RATELIMIT_WAIT = prometheus_client.Histogram('wecubek8s_k8s_ratelimit_wait_seconds',
+                                                 'Time waited for client-side rate limiter', ['cluster', 'kind'],
+                                                 buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')))
+K8S_RATELIMIT_REJECTED = prometheus_client.Counter('wecubek8s_k8s_ratelimit_rejected_total',
+                                                   'Kubernetes api calls rejected by client-side rate limiter',
+                                                   ['cluster', 'kind'])
+WATCH_EVENTS = prometheus_client.Counter('wecubek8s_watch_events_total', 'Pod watch events received',
+                                         ['cluster', 'type'])
+WATCH_EVENT_LAG = prometheus_client.Histogram('wecubek8s_watch_event_lag_seconds',
+                                              'Delay between pod creation and its ADDED event processed', ['cluster'],
+                                              buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, float('inf')))
+WATCH_RECONNECTS = prometheus_client.Counter('wecubek8s_watch_reconnects_total', 'Pod watch reconnects',
+                                             ['cluster', 'reason'])
+NOTIFY_QUEUE_DEPTH = prometheus_client.Gauge('wecubek8s_notify_queue_depth', 'Notifications waiting to be sent',
+                                             ['stage'],
+                                             multiprocess_mode='livemax')
+NOTIFY_LATENCY = prometheus_client.Histogram('wecubek8s_notify_latency_seconds',
+                                             'Delay between notification enqueued and sent', ['event'],
+                                             buckets=(0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 3600, float('inf')))
+NOTIFY_RESULTS = prometheus_client.Counter('wecubek8s_notify_total', 'Notifications sent', ['event', 'status'])
+ENTITY_LIST_DURATION = prometheus_client.Histogram('wecubek8s_entity_list_duration_seconds',
+                                                   'Latency of listing entities from all clusters', ['entity'])
+JSONFILTER_DURATION = prometheus_client.Histogram('wecubek8s_jsonfilter_duration_seconds',
+                                                  'Latency of filtering entities by jsonfilter', ['entity'])
+
+
+def multiprocess_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR', None) or os.environ.get('prometheus_multiproc_dir', None)
+
+
+def generate_latest():
+    if multiprocess_dir():
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry)
+    return prometheus_client.generate_latest()
+
+
+def start_http_server(port, addr='127.0.0.1'):
+    '''expose metrics of current process, for daemons without wsgi server(eg. watcher)
+    '''
+    prometheus_client.start_http_server(port, addr=addr)
+
+
+def mark_process_dead(pid):
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(pid)
+
+
+@contextlib.contextmanager
+def timer(histogram, *labels):
+    start = time.time()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.time() - start)
+
+
+def observe_k8s_response(cluster, action, result):
+    items = getattr(result, 'items', None)
+    if isinstance(items, list):
+        K8S_RESPONSE_ITEMS.labels(cluster, action).observe(len(items))
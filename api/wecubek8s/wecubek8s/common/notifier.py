@@ -0,0 +1,382 @@
+# coding=utf-8
+"""
+wecubek8s.common.notifier
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+本模块提供异步通知能力，通知进入有界队列，由工作线程并发发送，失败按指数退避重试
+
+OutboxNotifier将通知先写入本地SQLite(WAL)发件箱，发送成功后才删除，进程重启或下游故障时不丢失(至少一次)
+
+Coalescer在时间窗口内合并事件：同一对象的重复事件去重，同一对象的ADDED/DELETED成对抵消，剩余事件按分组批量输出；
+滚动重启时新旧Pod的uid不同，事件不会抵消，只有开启notify.batch才能将其合并为按Deployment的批量通知；
+指定journal时事件先写入发件箱数据库再进入窗口，合并结果持久化后才删除，窗口期内进程崩溃的事件在重启后重放
+
+"""
+
+from __future__ import absolute_import
+
+import collections
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from talos.core import config
+from talos.core import utils
+
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
+
+
+class Notifier:
+    '''bounded queue + worker pool, handler(*args) is called by workers
+
+    when queue is full, producer waits at most put_timeout seconds then drops the notification,
+    so that producer(eg. watch stream) is never blocked by slow consumers
+    '''
+    def __init__(self, handler, name='notifier'):
+        self.handler = handler
+        self.name = name
+        self.workers = utils.get_config(CONF, 'notify.workers', 8)
+        self.put_timeout = utils.get_config(CONF, 'notify.queue_put_timeout', 1)
+        self.max_retries = utils.get_config(CONF, 'notify.max_retries', 5)
+        self.retry_backoff = utils.get_config(CONF, 'notify.retry_backoff', 1)
+        self.retry_backoff_max = utils.get_config(CONF, 'notify.retry_backoff_max', 60)
+        self._queue = queue.Queue(utils.get_config(CONF, 'notify.queue_size', 10000))
+        self._threads = []
+        self._stopped = threading.Event()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name='%s-%d' % (self.name, i), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def put(self, *args):
+        try:
+            self._queue.put(args, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            LOG.error('%s queue is full, drop notification: %s', self.name, args)
+            return False
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def backoff(self, attempt):
+        delay = min(self.retry_backoff * (2**attempt), self.retry_backoff_max)
+        # jitter to avoid retrying all at the same time
+        return delay * random.uniform(0.5, 1.0)
+
+    def send(self, args):
+        attempt = 0
+        while True:
+            try:
+                self.handler(*args)
+                return True
+            except Exception as e:
+                if attempt >= self.max_retries or self._stopped.is_set():
+                    LOG.error('%s failed to send notification after %d retries: %s', self.name, attempt, args)
+                    LOG.exception(e)
+                    return False
+                delay = self.backoff(attempt)
+                LOG.warning('%s failed to send notification, retry in %.1fs: %s, reason: %s', self.name, delay, args,
+                            str(e))
+                # wake up immediately if stopping
+                self._stopped.wait(delay)
+                attempt += 1
+
+    def _run(self):
+        while not (self._stopped.is_set() and self._queue.empty()):
+            try:
+                args = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self.send(args)
+            finally:
+                self._queue.task_done()
+
+
+class Outbox:
+    '''durable FIFO of json serializable items, stored in sqlite with WAL journal
+
+    several outboxes(tables) can share one database file
+    '''
+    def __init__(self, path, table='outbox'):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS %s (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                               'data TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_time REAL NOT NULL)' %
+                               self.table)
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_%s_next_time ON %s (next_time)' %
+                               (self.table, self.table))
+            # items failed too many times, kept for manual inspection/replay
+            self._conn.execute('CREATE TABLE IF NOT EXISTS %s_dead (id INTEGER PRIMARY KEY, data TEXT NOT NULL, '
+                               'attempts INTEGER NOT NULL, dead_time REAL NOT NULL)' % self.table)
+
+    def append(self, items):
+        '''returns row ids of items
+        '''
+        now = time.time()
+        with self._lock, self._conn:
+            return [
+                self._conn.execute('INSERT INTO %s (data, next_time) VALUES (?, ?)' % self.table,
+                                   (json.dumps(item), now)).lastrowid for item in items
+            ]
+
+    def fetch(self, limit, exclude_ids=None):
+        exclude_ids = exclude_ids or set()
+        with self._lock:
+            rows = self._conn.execute('SELECT id, data FROM %s WHERE next_time <= ? ORDER BY id LIMIT ?' % self.table,
+                                      (time.time(), limit + len(exclude_ids))).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows if row[0] not in exclude_ids][:limit]
+
+    def ack(self, row_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM %s WHERE id = ?' % self.table, (row_id, ))
+
+    def retry(self, row_id, delay, max_attempts, max_dead=100000):
+        '''reschedule item, returns False if it is moved to dead letters after max_attempts
+        '''
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE %s SET attempts = attempts + 1, next_time = ? WHERE id = ?' % self.table,
+                               (time.time() + delay, row_id))
+            row = self._conn.execute('SELECT attempts FROM %s WHERE id = ?' % self.table, (row_id, )).fetchone()
+            if row is None or row[0] < max_attempts:
+                return True
+            self._conn.execute('INSERT OR REPLACE INTO %s_dead (id, data, attempts, dead_time) '
+                               'SELECT id, data, attempts, ? FROM %s WHERE id = ?' % (self.table, self.table),
+                               (time.time(), row_id))
+            self._conn.execute('DELETE FROM %s WHERE id = ?' % self.table, (row_id, ))
+            self._conn.execute('DELETE FROM %s_dead WHERE id NOT IN '
+                               '(SELECT id FROM %s_dead ORDER BY id DESC LIMIT ?)' % (self.table, self.table),
+                               (max_dead, ))
+            return False
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(1) FROM %s' % self.table).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxNotifier(Notifier):
+    '''notifications are appended to outbox in batches, then loaded into queue for workers,
+    they are deleted from outbox only after sent successfully, failed ones are rescheduled,
+    and moved to dead letters(table outbox_dead) after notify.outbox_max_attempts
+
+    handler must be idempotent(eg. by a sequence number in args), notification may be sent more than once
+    '''
+    def __init__(self, handler, path, name='notifier'):
+        super().__init__(handler, name=name)
+        self.max_size = utils.get_config(CONF, 'notify.outbox_max_size', 100000)
+        # poison notifications(eg. rejected by downstream permanently) must not fill up outbox
+        self.max_attempts = utils.get_config(CONF, 'notify.outbox_max_attempts', 20)
+        self.flush_interval = utils.get_config(CONF, 'notify.outbox_flush_interval', 0.2)
+        self._outbox = Outbox(path)
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+
+    def start(self):
+        super().start()
+        thread = threading.Thread(target=self._load, name='%s-loader' % self.name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        super().stop(timeout)
+        self.flush()
+        self._outbox.close()
+
+    def put(self, *args):
+        with self._buffer_lock:
+            self._buffer.append(args)
+        return True
+
+    def qsize(self):
+        return self._outbox.count() + len(self._buffer)
+
+    def flush(self):
+        with self._buffer_lock:
+            items, self._buffer = self._buffer, []
+        if not items:
+            return
+        overflow = self._outbox.count() + len(items) - self.max_size
+        if overflow > 0:
+            LOG.error('%s outbox is full, drop %d notifications: %s', self.name, overflow, items[-overflow:])
+            items = items[:-overflow]
+        if items:
+            self._outbox.append(items)
+
+    def _load(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+                free = self._queue.maxsize - self._queue.qsize()
+                if free <= 0:
+                    continue
+                with self._inflight_lock:
+                    inflight = set(self._inflight)
+                for row_id, args in self._outbox.fetch(free, inflight):
+                    with self._inflight_lock:
+                        self._inflight.add(row_id)
+                    self._queue.put((row_id, args))
+            except Exception as e:
+                LOG.error('exception raised while loading %s outbox', self.name)
+                LOG.exception(e)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                row_id, args = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                if self.send(args):
+                    self._outbox.ack(row_id)
+                elif not self._stopped.is_set():
+                    if not self._outbox.retry(row_id, self.retry_backoff_max, self.max_attempts, self.max_size):
+                        LOG.error('%s notification failed %d times, moved to dead letters: %s', self.name,
+                                  self.max_attempts, args)
+            except Exception as e:
+                LOG.error('exception raised while sending %s notification: %s', self.name, args)
+                LOG.exception(e)
+            finally:
+                with self._inflight_lock:
+                    self._inflight.discard(row_id)
+                self._queue.task_done()
+
+
+class Coalescer:
+    '''hold events for window seconds, then emit(event, group, items) for each (event, group)
+
+    key_func(item) identifies an object, group_func(item) groups items into one emit,
+    events of the same object are deduplicated, opposite events(eg. ADDED then DELETED) of the same object
+    cancel each other. objects replaced by new ones(eg. pods of rolling restart) have different keys and never
+    cancel, they are only reduced to one emit per (event, group)
+
+    journal(Outbox) makes events durable while they are held: events are appended to journal before coalescing,
+    and deleted after emitted and committed by commit_func(eg. OutboxNotifier.flush), events left in journal
+    (eg. process crashed in window) are replayed by start()
+    '''
+    def __init__(self, emit, window, key_func, group_func, opposites=None, journal=None, commit_func=None):
+        self.emit = emit
+        self.window = window
+        self.key_func = key_func
+        self.group_func = group_func
+        self.opposites = opposites or {}
+        self.journal = journal
+        self.commit_func = commit_func
+        self._lock = threading.Lock()
+        # key -> (event, item, first seen time, journal row ids), ordered by first seen time
+        self._pending = collections.OrderedDict()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.journal:
+            rows = self.journal.fetch(self.journal.count())
+            if rows:
+                LOG.info('replay %d events from coalescer journal', len(rows))
+            for row_id, (event, item) in rows:
+                self._add(event, item, [row_id])
+        if self.window > 0:
+            self._thread = threading.Thread(target=self._run, name='coalescer', daemon=True)
+            self._thread.start()
+        else:
+            self.flush(force=True)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush(force=True)
+
+    def add(self, event, item):
+        if self.window <= 0:
+            self.emit(event, self.group_func(item), [item])
+            return
+        row_ids = self.journal.append([(event, item)]) if self.journal else []
+        self._add(event, item, row_ids)
+
+    def _add(self, event, item, row_ids):
+        key = self.key_func(item)
+        cancelled = []
+        with self._lock:
+            pending = self._pending.get(key, None)
+            if pending is None:
+                self._pending[key] = (event, item, time.time(), row_ids)
+            elif pending[0] == event:
+                # duplicated, keep the latest
+                self._pending[key] = (event, item, pending[2], pending[3] + row_ids)
+            elif self.opposites.get(pending[0], None) == event:
+                del self._pending[key]
+                cancelled = pending[3] + row_ids
+            else:
+                self._pending[key] = (event, item, pending[2], pending[3] + row_ids)
+        self._ack(cancelled)
+
+    def _ack(self, row_ids):
+        for row_id in row_ids:
+            self.journal.ack(row_id)
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self, force=False):
+        deadline = time.time() - self.window
+        groups = collections.OrderedDict()
+        with self._lock:
+            while self._pending:
+                key, (event, item, first_seen, row_ids) = next(iter(self._pending.items()))
+                if not force and first_seen > deadline:
+                    break
+                del self._pending[key]
+                group = groups.setdefault((event, self.group_func(item)), ([], []))
+                group[0].append(item)
+                group[1].extend(row_ids)
+        emitted = []
+        for (event, group), (items, row_ids) in groups.items():
+            try:
+                self.emit(event, group, items)
+                emitted.extend(row_ids)
+            except Exception as e:
+                # kept in journal, replayed after restart
+                LOG.error('exception raised while emitting %s events of %s', event, group)
+                LOG.exception(e)
+        if not emitted:
+            return
+        try:
+            if self.commit_func:
+                self.commit_func()
+            self._ack(emitted)
+        except Exception as e:
+            LOG.error('exception raised while committing coalesced events')
+            LOG.exception(e)
+
+    def _run(self):
+        interval = min(self.window, 1)
+        while not self._stopped.wait(interval):
+            self.flush()
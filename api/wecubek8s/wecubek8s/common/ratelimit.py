@@ -0,0 +1,123 @@
+# coding=utf-8
+"""
+wecubek8s.common.ratelimit
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+本模块提供K8s API客户端限流能力(类似client-go的QPS/Burst)
+
+每个集群的读/写分别对应一个令牌桶，桶状态保存在本地文件中并以文件锁保护，
+因此由同一容器内所有进程(gunicorn worker/watcher)以及所有线程/协程共享
+
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from talos.core import config
+from talos.core import utils
+
+from wecubek8s.common import metrics
+
+HAS_FCNTL = False
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    pass
+
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
+
+READ = 'read'
+WRITE = 'write'
+_STATE = struct.Struct('dd')
+
+
+class TokenBucket:
+    '''token bucket with state(tokens, last refill time) stored in file
+    '''
+    def __init__(self, filepath, qps, burst):
+        self.qps = float(qps)
+        self.burst = float(burst)
+        self._lock = threading.Lock()
+        self._fd = os.open(filepath, os.O_RDWR | os.O_CREAT, 0o600)
+        # in case of fcntl not available
+        self._state = None
+
+    def _read(self):
+        if HAS_FCNTL:
+            data = os.pread(self._fd, _STATE.size, 0)
+            if len(data) == _STATE.size:
+                return _STATE.unpack(data)
+            return None
+        return self._state
+
+    def _write(self, tokens, last):
+        if HAS_FCNTL:
+            os.pwrite(self._fd, _STATE.pack(tokens, last), 0)
+        else:
+            self._state = (tokens, last)
+
+    def reserve(self, max_wait):
+        '''take one token, returns seconds to wait before the token is available,
+        None if it can not be available in max_wait seconds
+        '''
+        with self._lock:
+            if HAS_FCNTL:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                state = self._read()
+                tokens = self.burst if state is None else min(self.burst, state[0] + (now - state[1]) * self.qps)
+                # tokens may be negative, which are reserved by waiting callers
+                tokens -= 1
+                wait = 0.0 if tokens >= 0 else -tokens / self.qps
+                if wait > max_wait:
+                    return None
+                self._write(tokens, now)
+                return wait
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def get_bucket(cluster, kind):
+    key = (cluster, kind)
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(key, None)
+        if bucket is None:
+            base_dir = utils.get_config(CONF, 'k8s.rate_limit.path', None) or tempfile.gettempdir()
+            os.makedirs(base_dir, exist_ok=True)
+            filepath = os.path.join(base_dir, 'wecubek8s_ratelimit_%s_%s' %
+                                    (hashlib.md5(cluster.encode('utf-8')).hexdigest(), kind))
+            bucket = TokenBucket(filepath, utils.get_config(CONF, 'k8s.rate_limit.%s_qps' % kind, 50),
+                                 utils.get_config(CONF, 'k8s.rate_limit.%s_burst' % kind, 100))
+            _BUCKETS[key] = bucket
+    return bucket
+
+
+def acquire(cluster, kind):
+    '''wait for a token of cluster, returns False if waiting longer than k8s.rate_limit.max_wait
+    '''
+    if not utils.get_config(CONF, 'k8s.rate_limit.enabled', True):
+        return True
+    wait = get_bucket(cluster, kind).reserve(utils.get_config(CONF, 'k8s.rate_limit.max_wait', 10))
+    if wait is None:
+        metrics.K8S_RATELIMIT_REJECTED.labels(cluster, kind).inc()
+        return False
+    metrics.K8S_RATELIMIT_WAIT.labels(cluster, kind).observe(wait)
+    if wait > 0:
+        LOG.debug('rate limited, wait %.3fs for %s request of %s', wait, kind, cluster)
+        time.sleep(wait)
+    return True
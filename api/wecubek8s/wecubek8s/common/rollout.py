@@ -0,0 +1,195 @@
+# coding=utf-8
+"""
+wecubek8s.common.rollout
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+本模块提供Deployment发布/删除完成等待能力，每个集群共享一个watch连接
+
+"""
+
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+
+from talos.core import config
+from talos.core import utils
+
+from wecubek8s.common import utils as plugin_utils
+
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
+watch = plugin_utils.LazyModule('kubernetes.watch')
+k8s_exceptions = plugin_utils.LazyModule('kubernetes.client.exceptions')
+
+# event type of items from list/get, not from watch stream
+SYNC = 'SYNC'
+# results of predicates, None means keep waiting
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+
+def rollout_complete(event_type, item):
+    '''same as `kubectl rollout status`, FAILED if progress deadline exceeded
+    '''
+    if event_type == 'DELETED' or item is None:
+        return None
+    if item.status is None or (item.status.observed_generation or 0) < (item.metadata.generation or 0):
+        return None
+    for condition in item.status.conditions or []:
+        if condition.type == 'Progressing' and condition.reason == 'ProgressDeadlineExceeded':
+            return FAILED
+    replicas = item.spec.replicas if item.spec.replicas is not None else 1
+    updated_replicas = item.status.updated_replicas or 0
+    if updated_replicas < replicas:
+        return None
+    if (item.status.replicas or 0) > updated_replicas:
+        return None
+    if (item.status.available_replicas or 0) < updated_replicas:
+        return None
+    return COMPLETE
+
+
+def deletion_complete(event_type, item):
+    return COMPLETE if event_type == 'DELETED' or item is None else None
+
+
+class Waiter:
+    def __init__(self, namespace, name, predicate):
+        self.namespace = namespace
+        self.name = name
+        self.predicate = predicate
+        self.event = threading.Event()
+        self.result = None
+
+    @property
+    def key(self):
+        return (self.namespace, self.name)
+
+    def check(self, event_type, item):
+        if self.event.is_set():
+            return
+        result = self.predicate(event_type, item)
+        if result:
+            self.result = result
+            self.event.set()
+
+
+class DeploymentWatcher:
+    '''multiplex all waiters of one cluster on a single deployment watch,
+    the watch starts with the first waiter and stops when idle,
+    k8s_client may be replaced(token rotated) while watching, the watch restarts with the new one
+    '''
+    def __init__(self, k8s_client):
+        self.k8s_client = k8s_client
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._thread = None
+
+    def wait(self, namespace, name, predicate, timeout):
+        '''returns result of predicate, None if timeout
+        '''
+        waiter = Waiter(namespace, name, predicate)
+        with self._lock:
+            self._waiters.setdefault(waiter.key, []).append(waiter)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        try:
+            # status may be ready before watch established
+            waiter.check(SYNC, self.k8s_client.get_deployment(name, namespace))
+            waiter.event.wait(timeout)
+            return waiter.result
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(waiter.key, [])
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                if not waiters:
+                    self._waiters.pop(waiter.key, None)
+
+    def _dispatch(self, event_type, item):
+        with self._lock:
+            waiters = list(self._waiters.get((item.metadata.namespace, item.metadata.name), []))
+        for waiter in waiters:
+            waiter.check(event_type, item)
+
+    def _sync(self, items):
+        mapping = dict([((item.metadata.namespace, item.metadata.name), item) for item in items])
+        with self._lock:
+            waiters = [waiter for key_waiters in self._waiters.values() for waiter in key_waiters]
+        for waiter in waiters:
+            waiter.check(SYNC, mapping.get(waiter.key, None))
+
+    def _idle(self):
+        with self._lock:
+            if not self._waiters:
+                self._thread = None
+                return True
+        return False
+
+    def _run(self):
+        idle_timeout = utils.get_config(CONF, 'k8s.watch_idle_timeout', 60)
+        # relist only when resourceVersion is unknown/expired, otherwise resume watching from it
+        resource_version = None
+        while not self._idle():
+            k8s_client = self.k8s_client
+            try:
+                if resource_version is None:
+                    items = k8s_client.list_all_deployment()
+                    self._sync(items.items)
+                    resource_version = items.metadata.resource_version
+                w = watch.Watch()
+                for event in w.stream(k8s_client.app_client.list_deployment_for_all_namespaces,
+                                      resource_version=resource_version,
+                                      timeout_seconds=idle_timeout):
+                    if event['type'] in ('ADDED', 'MODIFIED', 'DELETED'):
+                        self._dispatch(event['type'], event['object'])
+                        resource_version = event['object'].metadata.resource_version
+                    elif event['type'] == 'ERROR':
+                        # eg. 410 Gone, relist
+                        resource_version = None
+                        break
+                    if self._idle():
+                        w.stop()
+                        return
+                    if self.k8s_client is not k8s_client:
+                        # client replaced, stop watching with the stale token
+                        w.stop()
+                        resource_version = None
+                        break
+            except k8s_exceptions.ApiException as e:
+                LOG.warning('exception raised while watching deployment from %s, relist: %s',
+                            self.k8s_client.auth.api_server, e)
+                resource_version = None
+                time.sleep(0.5)
+            except Exception as e:
+                LOG.error('exception raised while watching deployment from %s', self.k8s_client.auth.api_server)
+                LOG.exception(e)
+                time.sleep(0.5)
+
+
+_WATCHERS = {}
+_WATCHERS_LOCK = threading.Lock()
+
+
+def get_deployment_watcher(k8s_client):
+    '''one watcher per cluster, api_server/token of cluster may change
+    '''
+    with _WATCHERS_LOCK:
+        watcher = _WATCHERS.get(k8s_client.cluster_id, None)
+        if watcher is None:
+            watcher = DeploymentWatcher(k8s_client)
+            _WATCHERS[k8s_client.cluster_id] = watcher
+        elif watcher.k8s_client is not k8s_client:
+            watcher.k8s_client = k8s_client
+    return watcher
+
+
+def wait_for_rollout(k8s_client, namespace, name, timeout):
+    return get_deployment_watcher(k8s_client).wait(namespace, name, rollout_complete, timeout)
+
+
+def wait_for_deletion(k8s_client, namespace, name, timeout):
+    return get_deployment_watcher(k8s_client).wait(namespace, name, deletion_complete, timeout)
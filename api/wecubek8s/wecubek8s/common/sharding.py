@@ -0,0 +1,100 @@
+# coding=utf-8
+"""
+wecubek8s.common.sharding
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+本模块提供watcher多副本分片能力
+
+副本通过watcher_member表心跳维持存活，集群按一致性哈希分配给存活副本，
+副本持有watcher_lease表中集群的租约时才进行watch，保证每个集群只被一个副本watch
+
+"""
+
+from __future__ import absolute_import
+
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import time
+
+from talos.core import config
+from talos.core import utils
+
+from wecubek8s.db import resource as db_resource
+
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=100):
+        self.nodes = sorted(set(nodes))
+        self._ring = sorted([(self._hash('%s#%d' % (node, i)), node) for node in self.nodes for i in range(replicas)])
+        self._keys = [item[0] for item in self._ring]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def get(self, key):
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[index][1]
+
+
+class ShardManager:
+    '''membership & lease management of current watcher replica
+
+    heartbeat() should be called periodically, it returns leases lost(eg. expired while db is unavailable),
+    watching of these clusters must be stopped
+    '''
+    def __init__(self, member_id=None):
+        self.member_id = member_id or utils.get_config(CONF, 'watcher.replica_id', None) or '%s-%d' % (
+            socket.gethostname(), os.getpid())
+        self.lease_ttl = utils.get_config(CONF, 'watcher.lease_ttl', 30)
+        self.heartbeat_interval = utils.get_config(CONF, 'watcher.heartbeat_interval', 5)
+        self.ring = HashRing([self.member_id])
+        self.leases = set()
+        self._last_heartbeat = 0
+        self._last_renewed = time.time()
+
+    def heartbeat(self):
+        now = time.time()
+        if now - self._last_heartbeat < self.heartbeat_interval:
+            return set()
+        try:
+            db_resource.WatcherMember().heartbeat(self.member_id, self.lease_ttl)
+            members = set(db_resource.WatcherMember().alive())
+            members.add(self.member_id)
+            if set(self.ring.nodes) != members:
+                LOG.info('watcher members changed: %s', sorted(members))
+                self.ring = HashRing(members)
+            held = db_resource.WatcherLease().renew(self.member_id, self.leases, self.lease_ttl)
+            self._last_heartbeat = now
+            self._last_renewed = now
+        except Exception as e:
+            LOG.error('exception raised while heartbeat of watcher: %s', self.member_id)
+            LOG.exception(e)
+            if now - self._last_renewed < self.lease_ttl:
+                return set()
+            # leases may be acquired by others after expired
+            held = set()
+        lost = self.leases - held
+        self.leases = held
+        return lost
+
+    def owns(self, cluster_id):
+        return self.ring.get(cluster_id) == self.member_id
+
+    def acquire(self, cluster_id):
+        if db_resource.WatcherLease().acquire(cluster_id, self.member_id, self.lease_ttl):
+            self.leases.add(cluster_id)
+            return True
+        return False
+
+    def release(self, cluster_id):
+        self.leases.discard(cluster_id)
+        db_resource.WatcherLease().release(self.member_id, [cluster_id])
@@ -14,11 +14,16 @@ import logging
 import os.path
 import shutil
 import tempfile
+import threading
 import time
 import hashlib
-from Crypto.Cipher import AES
+import http.cookiejar
+import importlib
+from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from talos.core import config
 from talos.core import utils
 from talos.core import exceptions as base_ex
@@ -35,6 +40,24 @@ except:
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
 
+
+class LazyModule:
+    '''proxy of module, module is imported on first attribute access
+
+    for heavy modules(eg. kubernetes) which are not used by every process
+    '''
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+AES = LazyModule('Crypto.Cipher.AES')
+
 # register jar,war,apk as zip file
 shutil.register_unpack_format('jar', ['.jar'], shutil._UNPACK_FORMATS['zip'][1])
 shutil.register_unpack_format('war', ['.war'], shutil._UNPACK_FORMATS['zip'][1])
@@ -141,6 +164,48 @@ def json_or_error(func):
     return _json_or_error
 
 
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(url):
+    '''get shared session of url's base(scheme://host:port), connections are kept alive & pooled,
+    idempotent requests are retried on connection error or 502/503/504
+
+    session is shared by all callers(users), cookies from responses(eg. Set-Cookie: accessToken) are never kept
+    '''
+    parsed = urlparse(url)
+    base_url = '%s://%s' % (parsed.scheme, parsed.netloc)
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(base_url, None)
+        if session is None:
+            retry_options = {
+                'total': utils.get_config(CONF, 'http.retries', 3),
+                'backoff_factor': utils.get_config(CONF, 'http.retry_backoff', 0.3),
+                'status_forcelist': (502, 503, 504),
+                'raise_on_status': False
+            }
+            try:
+                retry = Retry(allowed_methods=Retry.DEFAULT_ALLOWED_METHODS, **retry_options)
+            except TypeError:
+                # urllib3 < 1.26
+                retry = Retry(method_whitelist=Retry.DEFAULT_METHOD_WHITELIST, **retry_options)
+            adapter = HTTPAdapter(pool_connections=utils.get_config(CONF, 'http.pool_connections', 10),
+                                  pool_maxsize=utils.get_config(CONF, 'http.pool_maxsize', 20),
+                                  max_retries=retry)
+            session = requests.Session()
+            session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            session.mount(base_url, adapter)
+            _SESSIONS[base_url] = session
+    return session
+
+
+def http_request(method, url, **kwargs):
+    kwargs.setdefault('timeout', (utils.get_config(CONF, 'http.connect_timeout', 5),
+                                  utils.get_config(CONF, 'http.read_timeout', 60)))
+    return get_session(url).request(method, url, **kwargs)
+
+
 class RestfulJson(object):
     @staticmethod
     def get_response_json(resp, default=None):
@@ -152,35 +217,35 @@ class RestfulJson(object):
     @staticmethod
     @json_or_error
     def post(url, **kwargs):
-        resp = requests.post(url, **kwargs)
+        resp = http_request('POST', url, **kwargs)
         resp.raise_for_status()
         return RestfulJson.get_response_json(resp)
 
     @staticmethod
     @json_or_error
     def get(url, **kwargs):
-        resp = requests.get(url, **kwargs)
+        resp = http_request('GET', url, **kwargs)
         resp.raise_for_status()
         return RestfulJson.get_response_json(resp)
 
     @staticmethod
     @json_or_error
     def patch(url, **kwargs):
-        resp = requests.patch(url, **kwargs)
+        resp = http_request('PATCH', url, **kwargs)
         resp.raise_for_status()
         return RestfulJson.get_response_json(resp)
 
     @staticmethod
     @json_or_error
     def delete(url, **kwargs):
-        resp = requests.delete(url, **kwargs)
+        resp = http_request('DELETE', url, **kwargs)
         resp.raise_for_status()
         return RestfulJson.get_response_json(resp)
 
     @staticmethod
     @json_or_error
     def put(url, **kwargs):
-        resp = requests.put(url, **kwargs)
+        resp = http_request('PUT', url, **kwargs)
         resp.raise_for_status()
         return RestfulJson.get_response_json(resp)
 
@@ -198,10 +263,29 @@ def b64decode_key(key):
                 raise e
 
 
+def get_auth_exempt_paths():
+    return utils.get_config(CONF, 'auth_exempt_paths', None) or []
+
+
 def get_token():
+    delayed_token = utils.get_attr(scoped_globals.GLOBALS, 'request.auth_token_delayed')
+    if delayed_token:
+        return delayed_token()
     return utils.get_attr(scoped_globals.GLOBALS, 'request.auth_token') or CONF.wecube.token
 
 
+def capture_scoped_globals():
+    '''capture request scoped globals, so that they can be restored in another thread
+    '''
+    return dict([(name, getattr(scoped_globals.GLOBALS, name, None))
+                 for name in ('request', 'response', 'controller', 'route_params')])
+
+
+def restore_scoped_globals(values):
+    for name, value in values.items():
+        setattr(scoped_globals.GLOBALS, name, value)
+
+
 class ClientMixin:
     # mixin need self.token & self.server
     def build_headers(self):
@@ -6,9 +6,14 @@ wecubek8s.common.wecmdb
 本模块提供项目WeCMDB Client
 
 """
+import hashlib
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor as PoolExecutor
 
+from talos.common import cache
 from talos.core import config
+from talos.core import utils as base_utils
 from talos.core.i18n import _
 from wecubek8s.common import exceptions
 from wecubek8s.common import utils
@@ -33,6 +38,9 @@ class EntityClient(utils.ClientMixin):
 
 class WeCMDBClient(utils.ClientMixin):
     """WeCMDB Client"""
+    # generation of metadata cache, changed to invalidate all cached metadata
+    METADATA_GENERATION_KEY = 'wecmdb.metadata.generation'
+
     def __init__(self, server, token=None):
         self.server = server.rstrip('/')
         self.token = token or utils.get_token()
@@ -85,17 +93,44 @@ class WeCMDBClient(utils.ClientMixin):
                     raise exceptions.PluginError(message=resp_json['data'][0]['errorMessage'])
             raise exceptions.PluginError(message=resp_json['statusMessage'])
 
+    @classmethod
+    def invalidate_metadata(cls):
+        '''invalidate all cached metadata(citypes/citype_attrs/enumcodes/special_connector)
+        '''
+        cache.set(cls.METADATA_GENERATION_KEY, base_utils.generate_uuid())
+
+    def cached_metadata(self, url, data=None):
+        '''read-through cache of nearly static metadata, keyed by token & url & query body,
+        cache backend(memory/redis) is configured by "cache", which decides sharing across workers or not
+
+        metadata visible to users may differ by their permissions, so cached data is never shared between tokens
+        '''
+        expires = base_utils.get_config(CONF, 'wecmdb.metadata_cache_ttl', 300)
+        if expires <= 0:
+            return self.get(url) if data is None else self.post(url, data)
+        generation = cache.get(self.METADATA_GENERATION_KEY, -1)
+        if not cache.validate(generation):
+            generation = ''
+        # digest only, raw token must not be stored in cache backend
+        token_digest = hashlib.sha256((self.token or '').encode('utf-8')).hexdigest()
+        cached_key = 'wecmdb.metadata.%s.%s.%s.%s' % (generation, token_digest, url, json.dumps(data, sort_keys=True))
+        cached_data = cache.get(cached_key, expires)
+        if not cache.validate(cached_data):
+            cached_data = self.get(url) if data is None else self.post(url, data)
+            cache.set(cached_key, cached_data)
+        return cached_data
+
     def special_connector(self):
         url = self.server + self.build_connector_url()
-        return self.get(url)
+        return self.cached_metadata(url)
 
     def citypes(self, data):
         url = self.server + self.build_citype_url()
-        return self.post(url, data)
+        return self.cached_metadata(url, data)
 
     def citype_attrs(self, data):
         url = self.server + self.build_citype_attrs_url()
-        return self.post(url, data)
+        return self.cached_metadata(url, data)
 
     def state_operation(self, operation, data):
         url = self.server + self.build_state_operation_url()
@@ -103,7 +138,7 @@ class WeCMDBClient(utils.ClientMixin):
 
     def enumcodes(self, data):
         url = self.server + self.build_enumcode_url()
-        return self.post(url, data)
+        return self.cached_metadata(url, data)
 
     def version_tree(self, citype_from, citype_to, version, query):
         url = self.server + self.build_version_tree_url(citype_from, citype_to, version)
@@ -124,3 +159,52 @@ class WeCMDBClient(utils.ClientMixin):
     def delete(self, citype, data):
         url = self.server + self.build_delete_url(citype)
         return self.post(url, data)
+
+    def _bulk_chunk(self, url, chunk):
+        '''post one chunk, returns (succeeded items, failed items)
+        '''
+        try:
+            LOG.info('POST %s', url)
+            resp_json = utils.RestfulJson.post(url, headers=self.build_headers(), json=chunk)
+        except exceptions.PluginError as e:
+            return [], [{'data': item, 'errorMessage': str(e)} for item in chunk]
+        if resp_json['statusCode'] == 'OK':
+            return resp_json.get('data', None) or [], []
+        results = resp_json.get('data', None)
+        if isinstance(results, list) and any(['errorMessage' in item for item in results if isinstance(item, dict)]):
+            succeeded = [item for item in results if not (isinstance(item, dict) and 'errorMessage' in item)]
+            failed = [{
+                'data': item,
+                'errorMessage': item['errorMessage']
+            } for item in results if isinstance(item, dict) and 'errorMessage' in item]
+            return succeeded, failed
+        return [], [{'data': item, 'errorMessage': resp_json.get('statusMessage', None)} for item in chunk]
+
+    def _bulk(self, url, data, chunk_size=None, concurrency=None):
+        '''split data into chunks, post them concurrently, and merge results of all chunks as:
+        {'statusCode': 'OK' or 'ERROR', 'data': [succeeded items], 'errors': [{'data': item, 'errorMessage': msg}]}
+        '''
+        chunk_size = chunk_size or base_utils.get_config(CONF, 'wecmdb.bulk_chunk_size', 100)
+        concurrency = concurrency or base_utils.get_config(CONF, 'wecmdb.bulk_concurrency', 4)
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        if len(chunks) <= 1 or concurrency <= 1:
+            results = [self._bulk_chunk(url, chunk) for chunk in chunks]
+        else:
+            with PoolExecutor(min(concurrency, len(chunks))) as pool:
+                # keep results in chunk order
+                results = list(pool.map(lambda chunk: self._bulk_chunk(url, chunk), chunks))
+        succeeded = [item for result in results for item in result[0]]
+        failed = [item for result in results for item in result[1]]
+        return {'statusCode': 'ERROR' if failed else 'OK', 'data': succeeded, 'errors': failed}
+
+    def create_bulk(self, citype, data, chunk_size=None, concurrency=None):
+        url = self.server + self.build_create_url(citype)
+        return self._bulk(url, data, chunk_size=chunk_size, concurrency=concurrency)
+
+    def update_bulk(self, citype, data, chunk_size=None, concurrency=None):
+        url = self.server + self.build_update_url(citype)
+        return self._bulk(url, data, chunk_size=chunk_size, concurrency=concurrency)
+
+    def delete_bulk(self, citype, data, chunk_size=None, concurrency=None):
+        url = self.server + self.build_delete_url(citype)
+        return self._bulk(url, data, chunk_size=chunk_size, concurrency=concurrency)
@@ -2,7 +2,7 @@
 
 from __future__ import absolute_import
 
-from sqlalchemy import Column, String, DateTime, Integer
+from sqlalchemy import Column, String, DateTime, Integer, Text
 from sqlalchemy.ext.declarative import declarative_base
 from talos.db.dictbase import DictBase
 
@@ -23,4 +23,38 @@ class Cluster(Base, DictBase):
     created_by = Column(String(36))
     created_time = Column(DateTime)
     updated_by = Column(String(36))
-    updated_time = Column(DateTime)
\ No newline at end of file
+    updated_time = Column(DateTime)
+
+
+class PluginJob(Base, DictBase):
+    __tablename__ = 'plugin_job'
+
+    id = Column(String(36), primary_key=True)
+    request_id = Column(String(255))
+    name = Column(String(255), nullable=False)
+    status = Column(String(36), nullable=False)
+    request = Column(Text)
+    result = Column(Text)
+    created_by = Column(String(36))
+    created_time = Column(DateTime)
+    updated_by = Column(String(36))
+    updated_time = Column(DateTime)
+
+
+class WatcherMember(Base, DictBase):
+    __tablename__ = 'watcher_member'
+
+    id = Column(String(255), primary_key=True)
+    expire_time = Column(DateTime, nullable=False)
+    created_time = Column(DateTime)
+    updated_time = Column(DateTime)
+
+
+class WatcherLease(Base, DictBase):
+    __tablename__ = 'watcher_lease'
+
+    id = Column(String(255), primary_key=True)
+    owner = Column(String(255), nullable=False)
+    expire_time = Column(DateTime, nullable=False)
+    created_time = Column(DateTime)
+    updated_time = Column(DateTime)
@@ -3,9 +3,13 @@
 from __future__ import absolute_import
 import datetime
 
+from sqlalchemy import func
+from sqlalchemy import or_
+
 from talos.core.i18n import _
 from talos.core import utils
 from talos.core import config
+from talos.core import exceptions as base_ex
 from talos.db import crud
 from talos.utils import scoped_globals
 
@@ -21,11 +25,11 @@ class MetaCRUD(crud.ResourceBase):
     def _before_create(self, resource, validate):
         if 'id' not in resource:
             resource['id'] = utils.generate_prefix_uuid(self._id_prefix)
-        resource['created_by'] = scoped_globals.GLOBALS.request.auth_user or None
+        resource['created_by'] = utils.get_attr(scoped_globals.GLOBALS, 'request.auth_user') or None
         resource['created_time'] = datetime.datetime.now()
 
     def _before_update(self, rid, resource, validate):
-        resource['updated_by'] = scoped_globals.GLOBALS.request.auth_user or None
+        resource['updated_by'] = utils.get_attr(scoped_globals.GLOBALS, 'request.auth_user') or None
         resource['updated_time'] = datetime.datetime.now()
 
 
@@ -60,3 +64,133 @@ class Cluster(MetaCRUD):
         for field in self._encrypted_fields:
             ref[field] = k8s_utils.platform_decrypt(ref[field], ref['id'], CONF.platform_encrypt_seed)
         return ref
+
+
+class PluginJob(MetaCRUD):
+    orm_meta = models.PluginJob
+    _primary_keys = 'id'
+    _default_order = ['-created_time']
+    _id_prefix = 'job-'
+    # request may contain token/password
+    _encrypted_fields = ['request', 'result']
+
+    def _before_create(self, resource, validate):
+        super()._before_create(resource, validate)
+        for field in self._encrypted_fields:
+            if resource.get(field):
+                resource[field] = k8s_utils.platform_encrypt(resource[field], resource['id'],
+                                                             CONF.platform_encrypt_seed)
+
+    def _before_update(self, rid, resource, validate):
+        super()._before_update(rid, resource, validate)
+        for field in self._encrypted_fields:
+            if resource.get(field):
+                resource[field] = k8s_utils.platform_encrypt(resource[field], rid, CONF.platform_encrypt_seed)
+
+    def list(self, filters=None, orders=None, offset=None, limit=None, hooks=None):
+        refs = super().list(filters=filters, orders=orders, offset=offset, limit=limit, hooks=hooks)
+        for ref in refs:
+            for field in self._encrypted_fields:
+                if ref[field]:
+                    ref[field] = k8s_utils.platform_decrypt(ref[field], ref['id'], CONF.platform_encrypt_seed)
+        return refs
+
+    def get(self, rid):
+        ref = super().get(rid)
+        if ref:
+            for field in self._encrypted_fields:
+                if ref[field]:
+                    ref[field] = k8s_utils.platform_decrypt(ref[field], ref['id'], CONF.platform_encrypt_seed)
+        return ref
+
+    def transit(self, rid, from_status, resource):
+        '''update job only if its status is still in from_status, returns True if updated
+
+        avoid finishing a job twice, eg. job failed by scheduler(timeout) and then finished by worker
+        '''
+        resource = resource.copy()
+        self._before_update(rid, resource, False)
+        with self.transaction() as session:
+            rows = session.query(self.orm_meta).filter(self.orm_meta.id == rid).filter(
+                self.orm_meta.status.in_(list(from_status))).update(resource, synchronize_session=False)
+        return rows > 0
+
+
+def db_now(session):
+    # clocks of watcher replicas may differ, expire_time is always set & compared by db time
+    return session.query(func.now()).scalar()
+
+
+class WatcherMember(crud.ResourceBase):
+    orm_meta = models.WatcherMember
+    _primary_keys = 'id'
+    _default_order = ['id']
+
+    def heartbeat(self, member_id, ttl):
+        with self.transaction() as session:
+            now = db_now(session)
+            values = {'expire_time': now + datetime.timedelta(seconds=ttl), 'updated_time': now}
+            rows = session.query(self.orm_meta).filter(self.orm_meta.id == member_id).update(
+                values, synchronize_session=False)
+            if not rows:
+                session.add(self.orm_meta(id=member_id, created_time=now, **values))
+
+    def alive(self):
+        with self.transaction() as session:
+            now = db_now(session)
+            # members dead for a long time are useless
+            session.query(self.orm_meta).filter(self.orm_meta.expire_time < now - datetime.timedelta(days=1)).delete(
+                synchronize_session=False)
+        return [ref['id'] for ref in self.list(filters={'expire_time': {'gt': now}})]
+
+
+class WatcherLease(crud.ResourceBase):
+    orm_meta = models.WatcherLease
+    _primary_keys = 'id'
+    _default_order = ['id']
+
+    def acquire(self, lease_id, owner, ttl):
+        '''acquire lease if it is free/expired/owned by owner, returns True if acquired
+        '''
+        with self.transaction() as session:
+            now = db_now(session)
+            values = {'owner': owner, 'expire_time': now + datetime.timedelta(seconds=ttl), 'updated_time': now}
+            rows = session.query(self.orm_meta).filter(self.orm_meta.id == lease_id).filter(
+                or_(self.orm_meta.owner == owner, self.orm_meta.expire_time < now)).update(
+                    values, synchronize_session=False)
+            if rows:
+                return True
+            if session.query(self.orm_meta).filter(self.orm_meta.id == lease_id).count():
+                # held by others
+                return False
+        try:
+            values['id'] = lease_id
+            values['created_time'] = now
+            self.create(values)
+            return True
+        except base_ex.ConflictError:
+            # held by others
+            return False
+
+    def renew(self, owner, lease_ids, ttl):
+        '''renew leases which are still held by owner, returns ids of them
+        '''
+        if not lease_ids:
+            return set()
+        with self.transaction() as session:
+            now = db_now(session)
+            values = {'expire_time': now + datetime.timedelta(seconds=ttl), 'updated_time': now}
+            query = session.query(self.orm_meta).filter(self.orm_meta.owner == owner).filter(
+                self.orm_meta.id.in_(list(lease_ids))).filter(self.orm_meta.expire_time >= now)
+            held = set([record.id for record in query.with_for_update()])
+            if held:
+                session.query(self.orm_meta).filter(self.orm_meta.id.in_(list(held))).update(
+                    values, synchronize_session=False)
+        return held
+
+    def release(self, owner, lease_ids):
+        if not lease_ids:
+            return
+        with self.transaction() as session:
+            session.query(self.orm_meta).filter(self.orm_meta.owner == owner).filter(
+                self.orm_meta.id.in_(list(lease_ids))).delete(synchronize_session=False)
@@ -2,18 +2,83 @@
 
 from __future__ import absolute_import
 
+import collections
+import functools
+import hashlib
+import threading
+import time
+
 import jwt
 import jwt.exceptions
 from talos.core import config
 from talos.core import exceptions as base_ex
+from talos.core import utils as base_utils
 from wecubek8s.common import utils
 
 CONF = config.CONF
 
 
+@functools.lru_cache(maxsize=4)
+def decode_key(secret):
+    return utils.b64decode_key(secret)
+
+
+class TokenCache:
+    """LRU of verified tokens, key: sha256 of token, value: token info, expired ones are never returned"""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items = collections.OrderedDict()
+
+    def get(self, token):
+        key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        with self._lock:
+            token_info = self._items.get(key, None)
+            if token_info is None:
+                return None
+            if token_info.get('exp', 0) <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return dict(token_info)
+
+    def set(self, token, token_info):
+        if self.maxsize <= 0:
+            return
+        key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        with self._lock:
+            self._items[key] = dict(token_info)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+class DelayedToken:
+    """token with exp delayed, signed on first call only"""
+    def __init__(self, token_info, key):
+        self.token_info = token_info
+        self.key = key
+        self._token = None
+
+    def __call__(self):
+        if self._token is None:
+            token_info = dict(self.token_info)
+            token_info['exp'] += 120
+            self._token = jwt.encode(token_info, self.key, algorithm='HS512').decode()
+        return self._token
+
+
 class JWTAuth(object):
     """中间件，提供JWT Token信息解析"""
+    def __init__(self):
+        self.token_cache = TokenCache(base_utils.get_config(CONF, 'auth.token_cache_size', 1024))
+
     def process_request(self, req, resp):
+        if req.path in utils.get_auth_exempt_paths():
+            req.auth_user = None
+            req.auth_permissions = set()
+            req.auth_client_type = None
+            return
         token_header = req.headers.get('Authorization'.upper(), None)
         token_cookie = req.get_cookie_values('accessToken')
         if token_cookie:
@@ -26,16 +91,19 @@ class JWTAuth(object):
             if secret:
                 verify_token = True
             try:
-                decoded_secret = utils.b64decode_key(secret)
-                token_info = jwt.decode(token, key=decoded_secret, verify=verify_token)
+                decoded_secret = decode_key(secret)
+                token_info = self.token_cache.get(token) if verify_token else None
+                if token_info is None:
+                    token_info = jwt.decode(token, key=decoded_secret, verify=verify_token)
+                    if verify_token:
+                        self.token_cache.set(token, token_info)
                 req.auth_user = token_info['sub']
                 authority = token_info.get('authority', None) or '[]'
                 req.auth_permissions = set(authority.strip('[]').split(','))
                 req.auth_client_type = token_info.get('clientType', None) or 'USER'
                 if verify_token:
-                    # delay token
-                    token_info['exp'] += 120
-                    req.auth_token = jwt.encode(token_info, decoded_secret, algorithm='HS512').decode()
+                    # delay token, re-signed only when it is used by utils.get_token
+                    req.auth_token_delayed = DelayedToken(token_info, decoded_secret)
             except jwt.exceptions.ExpiredSignatureError as e:
                 raise base_ex.AuthError()
             except jwt.exceptions.DecodeError as e:
@@ -2,7 +2,12 @@
 
 from __future__ import absolute_import
 
+import collections.abc
+import copy
 import logging
+import queue
+import threading
+
 from talos.core import config
 from talos.core import utils as base_utils
 from talos.core import exceptions as base_ex
@@ -11,21 +16,66 @@ LOG = logging.getLogger(__name__)
 CONF = config.CONF
 
 
+class OperationLogger(object):
+    """异步操作日志，请求数据入队时复制，序列化及文件写入在后台线程完成，队列满时丢弃"""
+    def __init__(self):
+        self.max_length = base_utils.get_config(CONF, 'operation_log.max_length', 4096)
+        self._queue = queue.Queue(base_utils.get_config(CONF, 'operation_log.queue_size', 10000))
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def log(self, user, method, uri, data):
+        if not LOG.isEnabledFor(logging.INFO):
+            return
+        if self._thread is None:
+            with self._lock:
+                # start in worker process, not in master before fork
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='operation-logger', daemon=True)
+                    self._thread.start()
+        try:
+            # handlers modify request data later(eg. set default values), log what user sent
+            self._queue.put_nowait((user, method, uri, copy.deepcopy(data)))
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            user, method, uri, data = self._queue.get()
+            try:
+                data = str(data)
+                if self.max_length > 0 and len(data) > self.max_length:
+                    data = '%s...(%d chars truncated)' % (data[:self.max_length], len(data) - self.max_length)
+                LOG.info('[%s] "%s %s" %s', user, method, uri, data)
+            except Exception as e:
+                LOG.exception(e)
+
+
 class Permission(object):
     """中间件，提供API权限校验"""
+    def __init__(self):
+        # controller name => frozenset(permissions) or {method: frozenset(permissions)}
+        self.data_permissions = {}
+        for controller_name, permissions in (base_utils.get_config(CONF, 'data_permissions', {}) or {}).items():
+            # nested config is Mapping but not dict
+            if isinstance(permissions, collections.abc.Mapping):
+                self.data_permissions[controller_name] = dict([(method.upper(), frozenset(method_permissions or []))
+                                                               for method, method_permissions in permissions.items()])
+            else:
+                self.data_permissions[controller_name] = frozenset(permissions or [])
+        self.plugin_permissions = frozenset(base_utils.get_config(CONF, 'plugin_permissions', []) or [])
+        self.operation_logger = OperationLogger()
+
     def process_resource(self, req, resp, resource, params):
-        request_data = getattr(req, 'json', None)
-        LOG.info('[%s] "%s %s" %s', req.auth_user, req.method, req.relative_uri, request_data)
+        self.operation_logger.log(req.auth_user, req.method, req.relative_uri, getattr(req, 'json', None))
         controller_name = getattr(resource, 'name', None)
-        data_permissions = base_utils.get_config(CONF, 'data_permissions', {})
-        if controller_name is not None and controller_name in data_permissions:
-            permissions = data_permissions[controller_name]
+        if controller_name is not None and controller_name in self.data_permissions:
+            permissions = self.data_permissions[controller_name]
             if isinstance(permissions, dict):
-                permissions = permissions.get(req.method.upper(), []) or []
-            if not set(permissions) & req.auth_permissions:
+                permissions = permissions.get(req.method.upper(), frozenset())
+            if permissions.isdisjoint(req.auth_permissions):
                 raise base_ex.ForbiddenError()
-        plugin_permissions = base_utils.get_config(CONF, 'plugin_permissions', [])
-        if controller_name is not None and controller_name in plugin_permissions:
+        if controller_name is not None and controller_name in self.plugin_permissions:
             # plugin controller not allow USER access
             if not (req.auth_user == 'SYS_PLATFORM' and 'SUB_SYSTEM' in req.auth_permissions):
                 raise base_ex.ForbiddenError()
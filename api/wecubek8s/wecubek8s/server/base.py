@@ -10,9 +10,6 @@ wecubek8s.server.base
 from __future__ import absolute_import
 
 import os
-from Crypto import Random
-from Crypto.Cipher import PKCS1_v1_5 as Cipher_pkcs1_v1_5
-from Crypto.PublicKey import RSA
 from talos.core import config
 
 from wecubek8s.common import utils as plugin_utils
@@ -21,6 +18,10 @@ RSA_KEY_PATH = '/certs/rsa_key'
 
 
 def decrypt_rsa(secret_key, encrypt_text):
+    # only required by RSA@ config values
+    from Crypto import Random
+    from Crypto.Cipher import PKCS1_v1_5 as Cipher_pkcs1_v1_5
+    from Crypto.PublicKey import RSA
     rsakey = RSA.importKey(secret_key)
     cipher = Cipher_pkcs1_v1_5.new(rsakey)
     random_generator = Random.new().read
@@ -30,7 +31,7 @@ def decrypt_rsa(secret_key, encrypt_text):
 
 @config.intercept('gateway_url', 'jwt_signing_key', 'sub_system_code', 'sub_system_key', 'platform_timezone',
                   'db_username', 'db_password', 'db_hostip', 'db_hostport', 'db_schema', 'platform_encrypt_seed',
-                  'notify_pod_added', 'notify_pod_deleted', 'log_level')
+                  'notify_pod_added', 'notify_pod_deleted', 'notify_batch', 'log_level')
 def get_env_value(value, origin_value):
     prefix = 'ENV@'
     encrypt_prefix = 'RSA@'
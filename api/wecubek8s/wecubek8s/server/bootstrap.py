@@ -0,0 +1,29 @@
+# coding=utf-8
+"""
+wecubek8s.server.bootstrap
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+本模块提供后台进程(watcher/scheduler)的轻量启动能力
+
+仅初始化配置、日志、国际化以及DB连接池，不构建wsgi application(中间件/路由)
+
+"""
+
+from __future__ import absolute_import
+
+import os
+from talos.server import base
+
+# register config interceptors(ENV@/RSA@)
+from wecubek8s.server import base as wecubek8s_base
+
+
+def initialize(appname='wecubek8s'):
+    base.initialize_config(os.environ.get('WECUBEK8S_CONF', '/etc/wecubek8s/wecubek8s.conf'),
+                           dir_path=os.environ.get('WECUBEK8S_CONF_DIR', '/etc/wecubek8s/wecubek8s.conf.d'))
+    base.initialize_logger()
+    base.initialize_i18n(appname)
+    base.initialize_db()
+
+
+initialize()
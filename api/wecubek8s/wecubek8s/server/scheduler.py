@@ -10,6 +10,7 @@ wecubek8s.server.scheduler
 from __future__ import absolute_import
 
 import os
+import json
 import shutil
 import time
 import datetime
@@ -17,11 +18,14 @@ import logging
 from pytz import timezone
 from talos.core import config
 from talos.core import logging as mylogger
+from talos.core import utils
 
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor
-from wecubek8s.server.wsgi_server import application
+from wecubek8s.server import bootstrap
+from wecubek8s.common import wecube
+from wecubek8s.db import resource as db_resource
 
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
@@ -92,6 +96,54 @@ def rotate_log():
         LOG.exception(e)
 
 
+def cleanup_plugin_jobs():
+    try:
+        now = datetime.datetime.now()
+        keep_days = utils.get_config(CONF, 'plugin.job_keep_days', 7)
+        count, refs = db_resource.PluginJob().delete_all(
+            filters={'created_time': {
+                'lt': now - datetime.timedelta(days=keep_days)
+            }})
+        LOG.info('remove %s plugin jobs created before %s days', count, keep_days)
+    except Exception as e:
+        LOG.exception(e)
+
+
+def fail_timeout_plugin_jobs():
+    # jobs interrupted by server restart(eg. worker restarted) will never finish, platform is still waiting for them
+    try:
+        job_timeout = utils.get_config(CONF, 'plugin.job_timeout', 3600)
+        refs = db_resource.PluginJob().list(filters={
+            'status': {
+                'in': ['pending', 'running']
+            },
+            'created_time': {
+                'lt': datetime.datetime.now() - datetime.timedelta(seconds=job_timeout)
+            }
+        })
+        for ref in refs:
+            try:
+                inputs = json.loads(ref['request']).get('inputs', None) if ref['request'] else None
+            except ValueError:
+                inputs = None
+            result = wecube.plugin_failed_result(ref['request_id'], inputs,
+                                                 'plugin job timeout after %s seconds' % job_timeout)
+            # job may be finished by worker just now
+            if not db_resource.PluginJob().transit(ref['id'], ['pending', 'running'], {
+                    'status': 'failed',
+                    'result': json.dumps(result)
+            }):
+                continue
+            LOG.info('mark plugin job: %s as failed, timeout', ref['id'])
+            try:
+                wecube.WeCubeClient(CONF.wecube.base_url, None).plugin_callback(result)
+            except Exception as e:
+                LOG.error('exception raised while callback plugin job: %s', ref['id'])
+                LOG.exception(e)
+    except Exception as e:
+        LOG.exception(e)
+
+
 def main():
     tz_info = timezone(CONF.timezone)
     try:
@@ -105,6 +157,11 @@ def main():
                                   timezone=tz_info)
     # scheduler.add_job(cleanup_cached_dir, 'cron', hour='*')
     scheduler.add_job(rotate_log, 'cron', hour=3, minute=5)
+    scheduler.add_job(cleanup_plugin_jobs, 'cron', minute=15)
+    scheduler.add_job(fail_timeout_plugin_jobs,
+                      'interval',
+                      seconds=utils.get_config(CONF, 'plugin.job_check_interval', 300),
+                      next_run_time=datetime.datetime.now(tz_info))
     try:
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):
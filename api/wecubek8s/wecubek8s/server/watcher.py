@@ -1,60 +1,119 @@
 # coding=utf-8
 from __future__ import absolute_import
+# all cluster watches are greenlets multiplexed on one gevent loop
+from gevent import monkey
+monkey.patch_all()
+
+import functools
 import logging
 import time
 from threading import Event
-from concurrent.futures import ThreadPoolExecutor as PoolExecutor
+
+import gevent
 from talos.core import config
 from talos.core import utils
 
-from wecubek8s.server.wsgi_server import application
+from wecubek8s.server import bootstrap
 from wecubek8s.apps.model import api
+from wecubek8s.common import metrics
+from wecubek8s.common import notifier
+from wecubek8s.common import sharding
 from wecubek8s.common import wecube
 
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
+NOTIFIER = None
+COALESCER = None
+
+
+def send_pod_event(event, cluster_id, operation_data, event_seq_no, enqueue_time=None):
+    operation_keys = {'POD.ADDED': CONF.notify.pod_added, 'POD.DELETED': CONF.notify.pod_deleted}
+    if not operation_keys.get(event, None):
+        metrics.NOTIFY_RESULTS.labels(event, 'skipped').inc()
+        return
+    try:
+        client = wecube.WeCubeClient(CONF.wecube.base_url, None)
+        client.post_as_subsystem(
+            client.build_url('/platform/v1/operation-events'), {
+                "eventSeqNo": event_seq_no,
+                "eventType": event,
+                "sourceSubSystem": CONF.wecube.sub_system_code,
+                "operationKey": operation_keys[event],
+                "operationData": operation_data,
+                "operationUser": "plugin-kubernetes-watcher"
+            })
+    except Exception:
+        metrics.NOTIFY_RESULTS.labels(event, 'failed').inc()
+        raise
+    metrics.NOTIFY_RESULTS.labels(event, 'success').inc()
+    if enqueue_time:
+        metrics.NOTIFY_LATENCY.labels(event).observe(time.time() - enqueue_time)
+
+
+def pod_group(data):
+    if utils.get_config(CONF, 'notify.coalesce_group', 'deployment') == 'deployment' and data['deployment_id']:
+        return (data['cluster_id'], data['deployment_id'])
+    return (data['cluster_id'], None)
+
+
+def emit_pod_events(event, group, items):
+    # sent by notifier workers, never block watch stream, retries share the same eventSeqNo
+    # without batch, each pod is still notified once(eg. rolling restart of N pods sends 2N notifications)
+    if utils.bool_from_string(utils.get_config(CONF, 'notify.batch', False)):
+        # operationData of batched event is comma separated pod ids of the same cluster(and deployment)
+        NOTIFIER.put(event, group[0], ','.join([item['id'] for item in items]),
+                     utils.generate_prefix_uuid("kubernetes-pod-"), time.time())
+    else:
+        for item in items:
+            NOTIFIER.put(event, group[0], item['id'], utils.generate_prefix_uuid("kubernetes-pod-"), time.time())
 
 
 def notify_pod(event, cluster_id, data):
     LOG.info('event: %s from cluster: %s with data: %s', event, cluster_id, data)
-    try:
-        if event == 'POD.ADDED' and CONF.notify.pod_added:
-            client = wecube.WeCubeClient(CONF.wecube.base_url, None)
-            client.login_subsystem()
-            client.post(
-                client.build_url('/platform/v1/operation-events'), {
-                    "eventSeqNo": utils.generate_prefix_uuid("kubernetes-pod-"),
-                    "eventType": event,
-                    "sourceSubSystem": CONF.wecube.sub_system_code,
-                    "operationKey": CONF.notify.pod_added,
-                    "operationData": data['id'],
-                    "operationUser": "plugin-kubernetes-watcher"
-                })
-        elif event == 'POD.DELETED' and CONF.notify.pod_deleted:
-            client = wecube.WeCubeClient(CONF.wecube.base_url, None)
-            client.login_subsystem()
-            client.post(
-                client.build_url('/platform/v1/operation-events'), {
-                    "eventSeqNo": utils.generate_prefix_uuid("kubernetes-pod-"),
-                    "eventType": event,
-                    "sourceSubSystem": CONF.wecube.sub_system_code,
-                    "operationKey": CONF.notify.pod_deleted,
-                    "operationData": data['id'],
-                    "operationUser": "plugin-kubernetes-watcher"
-                })
-    except Exception as e:
-        LOG.error('exception raised while notify pod: %s', data['id'])
-        LOG.exception(e)
-
-
-def watch_pod(cluster, event_stop):
+    COALESCER.add(event, data)
+
+
+def watch_selectors():
+    field_selectors = [s for s in (utils.get_config(CONF, 'watcher.field_selector', None) or '').split(',') if s]
+    # apiserver does not support OR of field selectors, so only excluding namespaces can be done by it
+    field_selectors.extend([
+        'metadata.namespace!=%s' % namespace
+        for namespace in utils.get_config(CONF, 'watcher.exclude_namespaces', None) or []
+    ])
+    return {
+        'label_selector': utils.get_config(CONF, 'watcher.label_selector', None) or None,
+        'field_selector': ','.join(field_selectors) or None
+    }
+
+
+def observe_pod_event(cluster_id, event_type, item):
+    # item is None for BOOKMARK
+    metrics.WATCH_EVENTS.labels(cluster_id, event_type).inc()
+    if event_type == 'ADDED' and item is not None and item.metadata.creation_timestamp:
+        metrics.WATCH_EVENT_LAG.labels(cluster_id).observe(time.time() - item.metadata.creation_timestamp.timestamp())
+
+
+def observe_queue_depth():
+    metrics.NOTIFY_QUEUE_DEPTH.labels('coalescer').set(COALESCER.pending())
+    metrics.NOTIFY_QUEUE_DEPTH.labels('notifier').set(NOTIFIER.qsize())
+
+
+def watch_pod(cluster, event_stop, namespace=None):
+    # keep resourceVersion between reconnecting
+    state = api.WatchState()
+    selectors = watch_selectors()
+    observe = functools.partial(observe_pod_event, cluster['id'])
     while not event_stop.is_set():
         try:
-            api.Pod().watch(cluster, event_stop, notify_pod)
+            api.Pod().watch(cluster, event_stop, notify_pod, state, namespace=namespace, observe=observe, **selectors)
+            # resourceVersion is reset when it is expired
+            reason = 'timeout' if state.resource_version else 'expired'
         except Exception as e:
-            LOG.error('exception raised while watching pod from %s', cluster['id'])
+            LOG.error('exception raised while watching pod from %s(namespace: %s)', cluster['id'], namespace)
             LOG.exception(e)
+            reason = 'error'
             time.sleep(0.5)
+        metrics.WATCH_RECONNECTS.labels(cluster['id'], reason).inc()
 
 
 def cluster_equal(cluster1, cluster2):
@@ -68,53 +127,101 @@ def cluster_equal(cluster1, cluster2):
     return cluster1 == cluster2
 
 
+def start_watch(cluster):
+    event_stop = Event()
+    # one watch for each allowed namespace, or one for all namespaces
+    namespaces = utils.get_config(CONF, 'watcher.namespaces', None) or [None]
+    return (cluster, event_stop, [gevent.spawn(watch_pod, cluster, event_stop, namespace) for namespace in namespaces])
+
+
+def stop_watch(watching):
+    cluster, event_stop, greenlets = watching
+    event_stop.set()
+    # interrupt blocking read of watch stream immediately
+    gevent.killall(greenlets, block=False)
+
+
+def watch_clusters(shard, cluster_maping):
+    for cluster_id in shard.heartbeat():
+        if cluster_id in cluster_maping:
+            LOG.info('stop watching pod from cluster with lease lost: %s', cluster_id)
+            stop_watch(cluster_maping.pop(cluster_id))
+    latest_clusters = api.db_resource.Cluster().list()
+    # only clusters assigned to this replica
+    latest_cluster_maping = dict([(cluster['id'], cluster) for cluster in latest_clusters
+                                  if shard.owns(cluster['id'])])
+    watching_cluster_ids = set(list(cluster_maping.keys()))
+    latest_cluster_ids = set(list(latest_cluster_maping.keys()))
+    new_cluster_ids = latest_cluster_ids - watching_cluster_ids
+    del_cluster_ids = watching_cluster_ids - latest_cluster_ids
+    mod_cluster_ids = latest_cluster_ids & watching_cluster_ids
+
+    if new_cluster_ids:
+        for cluster_id in new_cluster_ids:
+            # previous owner may not release it yet
+            if shard.acquire(cluster_id):
+                LOG.info('start watching pod from newly cluster: %s', cluster_id)
+                cluster_maping[cluster_id] = start_watch(latest_cluster_maping[cluster_id])
+    if del_cluster_ids:
+        for cluster_id in del_cluster_ids:
+            LOG.info('stop watching pod from deleted/reassigned cluster: %s', cluster_id)
+            stop_watch(cluster_maping.pop(cluster_id))
+            shard.release(cluster_id)
+
+    if mod_cluster_ids:
+        for cluster_id in mod_cluster_ids:
+            cluster = cluster_maping[cluster_id][0]
+            latest_cluster = latest_cluster_maping[cluster_id]
+            if not cluster_equal(latest_cluster, cluster):
+                LOG.info('stop watching pod from modified cluster: %s', cluster_id)
+                stop_watch(cluster_maping.pop(cluster_id))
+                LOG.info('start watching pod from modified cluster: %s', cluster_id)
+                cluster_maping[cluster_id] = start_watch(latest_cluster)
+
+
 def main():
+    global NOTIFIER
+    global COALESCER
     LOG.info('starting watcher')
-    pool = PoolExecutor(100)
+    outbox_path = utils.get_config(CONF, 'notify.outbox_path', None)
+    journal = None
+    commit_func = None
+    if outbox_path:
+        # survive restart & downstream outage
+        NOTIFIER = notifier.OutboxNotifier(send_pod_event, outbox_path, name='pod-notifier')
+        # events held by coalescer are durable too
+        journal = notifier.Outbox(outbox_path, table='coalescer')
+        commit_func = NOTIFIER.flush
+    else:
+        NOTIFIER = notifier.Notifier(send_pod_event, name='pod-notifier')
+    NOTIFIER.start()
+    # pod added & deleted in window(eg. rolling restart) will not be notified
+    COALESCER = notifier.Coalescer(emit_pod_events,
+                                   utils.get_config(CONF, 'notify.coalesce_window', 5),
+                                   key_func=lambda data: data['id'],
+                                   group_func=pod_group,
+                                   opposites={
+                                       'POD.ADDED': 'POD.DELETED',
+                                       'POD.DELETED': 'POD.ADDED'
+                                   },
+                                   journal=journal,
+                                   commit_func=commit_func)
+    COALESCER.start()
+    metrics_port = utils.get_config(CONF, 'watcher.metrics_port', 0)
+    if metrics_port:
+        metrics.start_http_server(metrics_port, utils.get_config(CONF, 'watcher.metrics_addr', '127.0.0.1'))
+    shard = sharding.ShardManager()
+    LOG.info('watcher replica: %s', shard.member_id)
     cluster_maping = {}
     while True:
-        latest_clusters = api.db_resource.Cluster().list()
-        latest_cluster_maping = dict(
-            zip([cluster['id'] for cluster in latest_clusters], [cluster for cluster in latest_clusters]))
-        watching_cluster_ids = set(list(cluster_maping.keys()))
-        latest_cluster_ids = set(list(latest_cluster_maping.keys()))
-        new_cluster_ids = latest_cluster_ids - watching_cluster_ids
-        del_cluster_ids = watching_cluster_ids - latest_cluster_ids
-        mod_cluster_ids = latest_cluster_ids & watching_cluster_ids
-
-        if new_cluster_ids:
-            for cluster_id in new_cluster_ids:
-                LOG.info('start watching pod from newly cluster: %s', cluster_id)
-                cluster = latest_cluster_maping[cluster_id]
-                event_stop = Event()
-                pool.submit(watch_pod, cluster, event_stop)
-                # add mapping
-                cluster_maping[cluster_id] = (cluster, event_stop)
-        if del_cluster_ids:
-            for cluster_id in del_cluster_ids:
-                LOG.info('stop watching pod from deleted cluster: %s', cluster_id)
-                cluster, event_stop = cluster_maping[cluster_id]
-                event_stop.set()
-                del cluster_maping[cluster_id]
-
-        if mod_cluster_ids:
-            for cluster_id in mod_cluster_ids:
-                cluster, event_stop = cluster_maping[cluster_id]
-                latest_cluster = latest_cluster_maping[cluster_id]
-                if not cluster_equal(latest_cluster, cluster):
-                    LOG.info('stop watching pod from modified cluster: %s', cluster_id)
-                    cluster, event_stop = cluster_maping[cluster_id]
-                    event_stop.set()
-                    del cluster_maping[cluster_id]
-                    LOG.info('start watching pod from modified cluster: %s', cluster_id)
-                    event_stop = Event()
-                    pool.submit(watch_pod, latest_cluster, event_stop)
-                    # add mapping
-                    cluster_maping[cluster_id] = (latest_cluster, event_stop)
+        try:
+            watch_clusters(shard, cluster_maping)
+            observe_queue_depth()
+        except Exception as e:
+            LOG.error('exception raised while refreshing clusters')
+            LOG.exception(e)
         time.sleep(1)
 
-    pool.shutdown(True)
-
 
 if __name__ == '__main__':
     main()
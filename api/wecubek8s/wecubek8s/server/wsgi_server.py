@@ -9,6 +9,9 @@ wecubek8s.server.wsgi_server
 
 from __future__ import absolute_import
 
+import gc
+import importlib
+import logging
 import os
 import json
 from talos.server import base
@@ -23,6 +26,10 @@ from wecubek8s.middlewares import permission
 from wecubek8s.middlewares import language
 from wecubek8s.server import base as wecubek8s_base
 
+LOG = logging.getLogger(__name__)
+# heavy modules imported lazily by workers, imported in master by warmup() with preload_app
+WARMUP_MODULES = ['kubernetes.client', 'kubernetes.watch', 'Crypto.Cipher.AES', 'M2Crypto.RSA']
+
 
 def error_serializer(req, resp, exception):
     representation = exception.to_dict()
@@ -44,9 +51,26 @@ application = base.initialize_server('wecubek8s',
                                          globalvars.GlobalVars(),
                                          json_translator.JSONTranslator(),
                                          lazy_init.LazyInit(limiter.Limiter),
-                                         auth.JWTAuth(),
-                                         permission.Permission()
+                                         # token cache size & permission tables are read from config,
+                                         # which is not loaded yet
+                                         lazy_init.LazyInit(auth.JWTAuth),
+                                         lazy_init.LazyInit(permission.Permission)
                                      ],
                                      override_middlewares=True)
 application.set_error_serializer(error_serializer)
 application.req_options.auto_parse_qs_csv = True
+
+
+def warmup():
+    '''called in gunicorn master with preload_app, before forking workers
+
+    imports lazily imported heavy modules and freezes all objects(config, routes, validators),
+    so that workers share them copy-on-write, gc of workers will not touch them either
+    '''
+    for name in WARMUP_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            LOG.warning('failed to warm up module %s: %s', name, e)
+    gc.collect()
+    gc.freeze()
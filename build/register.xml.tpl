@@ -77,6 +77,9 @@
         <systemParameter name="KUBERNETES_NOTIFY_POD_ADDED" scopeType="plugins" defaultValue="kubernetes-pod-added" />
         <systemParameter name="KUBERNETES_NOTIFY_POD_DELETED" scopeType="plugins" defaultValue="kubernetes-pod-deleted" />
         <systemParameter name="KUBERNETES_LOG_LEVEL" scopeType="plugins" defaultValue="info" />
+        <!-- true: pod events of the same deployment within notify.coalesce_window are sent as one event,
+             operationData is comma separated pod ids(eg. "uid1,uid2"), false: operationData is one pod id -->
+        <systemParameter name="KUBERNETES_NOTIFY_BATCH" scopeType="plugins" defaultValue="false" />
     </systemParameters>
 
     <!-- 5.权限设定 -->
@@ -85,7 +88,7 @@
 
     <!-- 6.运行资源 - 描述部署运行本插件包需要的基础资源(如主机、虚拟机、容器、数据库等) -->
     <resourceDependencies>
-        <docker imageName="{{IMAGENAME}}" containerName="{{CONTAINERNAME}}" portBindings="{{ALLOCATE_PORT}}:9001" volumeBindings="/etc/localtime:/etc/localtime,{{BASE_MOUNT_PATH}}/kubernetes/logs:/var/log/wecubek8s,{{BASE_MOUNT_PATH}}/certs:/certs" envVariables="GATEWAY_URL={{GATEWAY_URL}},JWT_SIGNING_KEY={{JWT_SIGNING_KEY}},SUB_SYSTEM_CODE={{SUB_SYSTEM_CODE}},SUB_SYSTEM_KEY={{SUB_SYSTEM_KEY}},KUBERNETES_DB_USERNAME={{DB_USER}},KUBERNETES_DB_PASSWORD={{DB_PWD}},KUBERNETES_DB_HOSTIP={{DB_HOST}},KUBERNETES_DB_HOSTPORT={{DB_PORT}},KUBERNETES_DB_SCHEMA={{DB_SCHEMA}},ENCRYPT_SEED={{ENCRYPT_SEED}},NOTIFY_POD_ADDED={{KUBERNETES_NOTIFY_POD_ADDED}},NOTIFY_POD_DELETED={{KUBERNETES_NOTIFY_POD_DELETED}},KUBERNETES_LOG_LEVEL={{KUBERNETES_LOG_LEVEL}}" />
+        <docker imageName="{{IMAGENAME}}" containerName="{{CONTAINERNAME}}" portBindings="{{ALLOCATE_PORT}}:9001" volumeBindings="/etc/localtime:/etc/localtime,{{BASE_MOUNT_PATH}}/kubernetes/logs:/var/log/wecubek8s,{{BASE_MOUNT_PATH}}/kubernetes/outbox:/data/wecubek8s/outbox,{{BASE_MOUNT_PATH}}/certs:/certs" envVariables="GATEWAY_URL={{GATEWAY_URL}},JWT_SIGNING_KEY={{JWT_SIGNING_KEY}},SUB_SYSTEM_CODE={{SUB_SYSTEM_CODE}},SUB_SYSTEM_KEY={{SUB_SYSTEM_KEY}},KUBERNETES_DB_USERNAME={{DB_USER}},KUBERNETES_DB_PASSWORD={{DB_PWD}},KUBERNETES_DB_HOSTIP={{DB_HOST}},KUBERNETES_DB_HOSTPORT={{DB_PORT}},KUBERNETES_DB_SCHEMA={{DB_SCHEMA}},ENCRYPT_SEED={{ENCRYPT_SEED}},NOTIFY_POD_ADDED={{KUBERNETES_NOTIFY_POD_ADDED}},NOTIFY_POD_DELETED={{KUBERNETES_NOTIFY_POD_DELETED}},NOTIFY_BATCH={{KUBERNETES_NOTIFY_BATCH}},KUBERNETES_LOG_LEVEL={{KUBERNETES_LOG_LEVEL}}" />
         <mysql schema="kubernetes" initFileName="init.sql" upgradeFileName="upgrade.sql" />
     </resourceDependencies>
 
@@ -169,6 +172,7 @@
                     <parameter datatype="string" mappingType="constant" required="N" description="node affinity(anti-host-preferred or anti-host-required)">affinity</parameter>
                     <parameter datatype="object"   mappingType="object" required="N" multiple="Y" refObjectName="deploymentEnv" description="pod envs">envs</parameter>
                     <!-- <parameter datatype="object" mappingType="constant" required="N" multiple="Y" refObjectName="deploymentVolume">volumes</parameter> -->
+                    <parameter datatype="string" mappingType="constant" required="N" description="seconds to wait for rollout(empty or 0 means no wait)">wait_timeout</parameter>
                 </inputParameters>
                 <outputParameters>
                     <parameter datatype="string">errorCode</parameter>
@@ -176,6 +180,7 @@
                     <parameter datatype="string">id</parameter>
                     <parameter datatype="string">name</parameter>
                     <parameter datatype="string">correlation_id</parameter>
+                    <parameter datatype="string">changed</parameter>
                 </outputParameters>
             </interface>
             <interface action="destroy" path="/kubernetes/v1/deployments/destroy" httpMethod="POST" isAsyncProcessing="N" type="EXECUTION">
@@ -183,6 +188,50 @@
                     <parameter datatype="string" mappingType="constant" required="Y">cluster</parameter>
                     <parameter datatype="string" mappingType="constant" required="Y">name</parameter>
                     <parameter datatype="string" mappingType="constant" required="N">namespace</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="seconds to wait for deletion(empty or 0 means no wait)">wait_timeout</parameter>
+                </inputParameters>
+                <outputParameters>
+                    <parameter datatype="string">errorCode</parameter>
+                    <parameter datatype="string">errorMessage</parameter>
+                    <parameter datatype="string">id</parameter>
+                    <parameter datatype="string">name</parameter>
+                    <parameter datatype="string">correlation_id</parameter>
+                </outputParameters>
+            </interface>
+            <interface action="async-apply" path="/kubernetes/v1/deployments/async-apply" httpMethod="POST" isAsyncProcessing="Y" type="EXECUTION">
+                <inputParameters>
+                    <parameter datatype="string" mappingType="constant" required="Y" description="cluster name">cluster</parameter>
+                    <parameter datatype="string" mappingType="constant" required="Y" description="associated ci data id">correlation_id</parameter>
+                    <parameter datatype="string" mappingType="constant" required="Y" description="deployment name(unique)">name</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="deployment namespace(default)">namespace</parameter>
+                    <parameter datatype="object" mappingType="constant" required="Y" multiple="Y" refObjectName="deploymentImage" description="pod images">images</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="docker pull image username(if private)">image_pull_username</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="docker pull image password(if private)">image_pull_password</parameter>
+                    <!-- <parameter datatype="object" mappingType="constant" required="N" multiple="Y" refObjectName="commonTag">tags</parameter> -->
+                    <parameter datatype="string" mappingType="constant" required="N" description="number of replica">replicas</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="cpu limited">cpu</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="memory limited">memory</parameter>
+                    <!-- <parameter datatype="object" mappingType="constant" required="N" multiple="Y" refObjectName="commonTag">pod_tags</parameter> -->
+                    <parameter datatype="string" mappingType="constant" required="N" description="node affinity(anti-host-preferred or anti-host-required)">affinity</parameter>
+                    <parameter datatype="object"   mappingType="object" required="N" multiple="Y" refObjectName="deploymentEnv" description="pod envs">envs</parameter>
+                    <!-- <parameter datatype="object" mappingType="constant" required="N" multiple="Y" refObjectName="deploymentVolume">volumes</parameter> -->
+                    <parameter datatype="string" mappingType="constant" required="N" description="seconds to wait for rollout(empty or 0 means no wait)">wait_timeout</parameter>
+                </inputParameters>
+                <outputParameters>
+                    <parameter datatype="string">errorCode</parameter>
+                    <parameter datatype="string">errorMessage</parameter>
+                    <parameter datatype="string">id</parameter>
+                    <parameter datatype="string">name</parameter>
+                    <parameter datatype="string">correlation_id</parameter>
+                    <parameter datatype="string">changed</parameter>
+                </outputParameters>
+            </interface>
+            <interface action="async-destroy" path="/kubernetes/v1/deployments/async-destroy" httpMethod="POST" isAsyncProcessing="Y" type="EXECUTION">
+                <inputParameters>
+                    <parameter datatype="string" mappingType="constant" required="Y">cluster</parameter>
+                    <parameter datatype="string" mappingType="constant" required="Y">name</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N">namespace</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="seconds to wait for deletion(empty or 0 means no wait)">wait_timeout</parameter>
                 </inputParameters>
                 <outputParameters>
                     <parameter datatype="string">errorCode</parameter>
@@ -213,6 +262,7 @@
                     <parameter datatype="string">id</parameter>
                     <parameter datatype="string">name</parameter>
                     <parameter datatype="string">correlation_id</parameter>
+                    <parameter datatype="string">changed</parameter>
                 </outputParameters>
             </interface>
             <interface action="destroy" path="/kubernetes/v1/services/destroy" httpMethod="POST" isAsyncProcessing="N" type="EXECUTION">
@@ -229,6 +279,42 @@
                     <parameter datatype="string">correlation_id</parameter>
                 </outputParameters>
             </interface>
+            <interface action="async-apply" path="/kubernetes/v1/services/async-apply" httpMethod="POST" isAsyncProcessing="Y" type="EXECUTION">
+                <inputParameters>
+                    <parameter datatype="string" mappingType="constant" required="Y" description="cluster name">cluster</parameter>
+                    <parameter datatype="string" mappingType="constant" required="Y" description="associated ci data id">correlation_id</parameter>
+                    <parameter datatype="string" mappingType="constant" required="Y" description="service name(unique)">name</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="service namespace(default)">namespace</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="service type(NodePort/ClusterIP/LoadBalancer)">type</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="cluster ip(if type=ClusterIP)">clusterIP</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N" description="session affinity(RoundRobin/ClientIP)">sessionAffinity</parameter>
+                    <parameter datatype="object" mappingType="constant" required="N" multiple="Y" refObjectName="commonTag" description="service tags">tags</parameter>
+                    <parameter datatype="object" mappingType="constant" required="Y" multiple="Y" refObjectName="commonTag" description="service selectors">selectors</parameter>
+                    <parameter datatype="object" mappingType="constant" required="Y" multiple="Y" refObjectName="servicePort" description="service port mappings">instances</parameter>
+                </inputParameters>
+                <outputParameters>
+                    <parameter datatype="string">errorCode</parameter>
+                    <parameter datatype="string">errorMessage</parameter>
+                    <parameter datatype="string">id</parameter>
+                    <parameter datatype="string">name</parameter>
+                    <parameter datatype="string">correlation_id</parameter>
+                    <parameter datatype="string">changed</parameter>
+                </outputParameters>
+            </interface>
+            <interface action="async-destroy" path="/kubernetes/v1/services/async-destroy" httpMethod="POST" isAsyncProcessing="Y" type="EXECUTION">
+                <inputParameters>
+                    <parameter datatype="string" mappingType="constant" required="Y">cluster</parameter>
+                    <parameter datatype="string" mappingType="constant" required="Y">name</parameter>
+                    <parameter datatype="string" mappingType="constant" required="N">namespace</parameter>
+                </inputParameters>
+                <outputParameters>
+                    <parameter datatype="string">errorCode</parameter>
+                    <parameter datatype="string">errorMessage</parameter>
+                    <parameter datatype="string">id</parameter>
+                    <parameter datatype="string">name</parameter>
+                    <parameter datatype="string">correlation_id</parameter>
+                </outputParameters>
+            </interface>
         </plugin>
     </plugins>
 </package>
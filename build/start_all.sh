@@ -1,4 +1,8 @@
 #!/bin/sh
+# metrics shared by all processes
+export PROMETHEUS_MULTIPROC_DIR=/data/wecubek8s/metrics
+rm -rf $PROMETHEUS_MULTIPROC_DIR
+mkdir -p $PROMETHEUS_MULTIPROC_DIR
 # log rotate
 nohup wecubek8s_scheduler > /dev/null 2>&1 &
 nohup wecubek8s_watcher > /dev/null 2>&1 &
@@ -0,0 +1,35 @@
+SET FOREIGN_KEY_CHECKS = 0;
+CREATE TABLE IF NOT EXISTS `plugin_job` (
+  `id` varchar(36) NOT NULL,
+  `request_id` varchar(255) DEFAULT NULL,
+  `name` varchar(255) NOT NULL,
+  `status` varchar(36) NOT NULL,
+  `request` longtext,
+  `result` longtext,
+  `created_by` varchar(36) DEFAULT NULL,
+  `created_time` datetime DEFAULT NULL,
+  `updated_by` varchar(36) DEFAULT NULL,
+  `updated_time` datetime DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `idx_plugin_job_request_id` (`request_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE TABLE IF NOT EXISTS `watcher_member` (
+  `id` varchar(255) NOT NULL,
+  `expire_time` datetime NOT NULL,
+  `created_time` datetime DEFAULT NULL,
+  `updated_time` datetime DEFAULT NULL,
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE TABLE IF NOT EXISTS `watcher_lease` (
+  `id` varchar(255) NOT NULL,
+  `owner` varchar(255) NOT NULL,
+  `expire_time` datetime NOT NULL,
+  `created_time` datetime DEFAULT NULL,
+  `updated_time` datetime DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `idx_watcher_lease_owner` (`owner`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+SET FOREIGN_KEY_CHECKS = 1;